@@ -0,0 +1,142 @@
+"""
+Requests/sec and latency through the WSGI and ASGI entry points on one dataset.
+
+    python -m benchmarks.bench_asgi --size 50000 --concurrency 16 --seconds 10
+
+Both applications are driven in-process, so the numbers compare Django's two
+request paths rather than a particular server. WSGI requests run on a thread
+pool, ASGI requests as concurrent tasks on one event loop, as under uvicorn.
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from benchmarks.common import populate, setup_django
+
+PATHS = ['/', '/cards/search/?q=goblin', '/cards/']
+
+
+def wsgi_request(application, url):
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': parts.path, 'QUERY_STRING': parts.query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'wsgi.input': BytesIO(), 'wsgi.errors': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        b''.join(body)
+    finally:
+        body.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_request(application, url):
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': parts.path, 'raw_path': parts.path.encode(), 'query_string': parts.query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Nobody disconnects; Django cancels this once the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def report(label, latencies, elapsed, errors):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f'{label:<6} {len(latencies) / elapsed:8.1f} req/s   median {statistics.median(latencies) * 1000:8.2f} ms   '
+          f'p99 {p99:8.2f} ms   errors {errors}')
+
+
+def run_wsgi(args):
+    from mtgcards.wsgi import application
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(number):
+        timings, i = [], number
+        while time.perf_counter() < deadline:
+            i += 1
+            start = time.perf_counter()
+            if wsgi_request(application, PATHS[i % len(PATHS)]) != 200:
+                with lock:
+                    errors[0] += 1
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    report('WSGI', latencies, time.perf_counter() - start, errors[0])
+
+
+def run_asgi(args):
+    from mtgcards.asgi import application
+
+    latencies, errors = [], [0]
+
+    async def worker(number, deadline):
+        i = number
+        while time.perf_counter() < deadline:
+            i += 1
+            start = time.perf_counter()
+            if await asgi_request(application, PATHS[i % len(PATHS)]) != 200:
+                errors[0] += 1
+            latencies.append(time.perf_counter() - start)
+
+    async def main():
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(*[worker(number, deadline) for number in range(args.concurrency)])
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    report('ASGI', latencies, time.perf_counter() - start, errors[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=50_000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    from django.conf import settings
+
+    # Production-like: no query log, and a host the requests can use
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['localhost']
+    populate(args.size)
+    print(f'{args.size:,} cards, {args.concurrency} concurrent clients, {args.seconds:g}s each, paths {PATHS}')
+    run_wsgi(args)
+    run_asgi(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Cards/sec for one CardForm per card vs a CardBatch, as behind /api/cards/bulk/.
+
+    python -m benchmarks.bench_bulk --sizes 1000 10000
+"""
+import argparse
+import time
+
+from benchmarks.common import fixture_objects, populate, setup_django
+
+
+# CardForm requires these, but some fixture cards leave them blank
+PLACEHOLDERS = {'power': '0', 'toughness': '0', 'set_name': 'Benchmark', 'image_url': 'https://example.com/bench.jpg'}
+
+
+def rows_for(count, templates, editions, colors, prefix):
+    rows = []
+    for i in range(count):
+        fields = templates[i % len(templates)]
+        rows.append({
+            'name': f"{fields['name']} {prefix}{i}", 'mana_cost': fields['mana_cost'], 'text': fields['text'],
+            'flavor': fields['flavor'], 'type': fields['type'], 'rarity': fields['rarity'],
+            **{name: fields[name] or placeholder for name, placeholder in PLACEHOLDERS.items()},
+            'edition': editions[fields['edition']],
+            'colors': ''.join(colors[pk] for pk in fields['colors']),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    from django.db import transaction
+
+    from cards.forms import CardBatch, CardForm
+    from cards.models import Color, Edition
+
+    populate(0)
+    objects = fixture_objects()
+    # CardForm requires at least one color
+    templates = [o['fields'] for o in objects if o['model'] == 'cards.card' and o['fields']['colors']]
+    editions = dict(Edition.objects.values_list('pk', 'code'))
+    colors = dict(Color.objects.values_list('pk', 'code'))
+
+    for size in args.sizes:
+        rows = rows_for(size, templates, editions, colors, 'f')
+        edition_ids = {code: pk for pk, code in editions.items()}
+        color_ids = {code: pk for pk, code in colors.items()}
+        start = time.perf_counter()
+        with transaction.atomic():
+            for row in rows:
+                form = CardForm({**row, 'edition': edition_ids[row['edition']],
+                                 'colors': [color_ids[code] for code in row['colors']]})
+                if not form.is_valid():
+                    raise SystemExit(form.errors.as_text())
+                form.save()
+        per_form = time.perf_counter() - start
+
+        rows = rows_for(size, templates, editions, colors, 'b')
+        start = time.perf_counter()
+        batch = CardBatch(rows)
+        if not batch.is_valid():
+            raise SystemExit(batch.errors[:3])
+        validated = time.perf_counter() - start
+        batch.save()
+        batched = time.perf_counter() - start
+
+        print(f'{size:>6} rows   CardForm per row {size / per_form:9,.0f} cards/s ({per_form:6.2f}s)   '
+              f'CardBatch {size / batched:9,.0f} cards/s ({batched:6.2f}s, {validated:5.2f}s validating)')
+
+
+if __name__ == '__main__':
+    main()
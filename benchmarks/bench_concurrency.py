@@ -0,0 +1,122 @@
+"""
+Concurrent readers against a bulk writer, default SQLite settings vs settings_production.
+
+    python -m benchmarks.bench_concurrency --size 50000 --readers 8 --seconds 10
+
+Each profile runs in its own process on its own database. Reader threads page
+through card listings while one writer keeps bulk-inserting batches of cards.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+PROFILES = {
+    'default': ('mtgcards.settings', {}),
+    'tuned': ('mtgcards.settings_production', {}),
+    'tuned+replica': ('mtgcards.settings_production', {'MTGCARDS_READ_REPLICA': '1'}),
+}
+
+
+def run_profile(args):
+    from benchmarks.common import populate, setup_django
+
+    setup_django()
+
+    from django.db import OperationalError, connections, transaction
+
+    from cards.models import Card
+
+    populate(args.size)
+    editions = list(Card.objects.order_by().values_list('edition_id', flat=True).distinct())
+    template = Card.objects.order_by('name').first()
+    stop = threading.Event()
+    latencies, errors, written = [], [], [0]
+    lock = threading.Lock()
+
+    def reader(number):
+        timings, failed, i = [], 0, number
+        while not stop.is_set():
+            i += 1
+            start = time.perf_counter()
+            try:
+                page = Card.objects.for_listing().filter(edition_id=editions[i % len(editions)]).order_by('name', 'id')
+                list(page[:50])
+                Card.objects.filter(power_value__gte=i % 6).count()
+            except OperationalError:
+                failed += 1
+                continue
+            timings.append(time.perf_counter() - start)
+        connections.close_all()
+        with lock:
+            latencies.extend(timings)
+            errors.append(failed)
+
+    def writer():
+        batch_number = 0
+        while not stop.is_set():
+            batch_number += 1
+            batch = [
+                Card(id=uuid.uuid4(), name=f'{template.name} w{batch_number}.{i}', mana_cost=template.mana_cost,
+                     type=template.type, power=template.power, toughness=template.toughness,
+                     rarity=template.rarity, set_name=template.set_name, image_url=template.image_url,
+                     edition_id=template.edition_id)
+                for i in range(args.batch_size)
+            ]
+            try:
+                with transaction.atomic():
+                    Card.objects.bulk_create(batch)
+            except OperationalError:
+                with lock:
+                    errors.append(1)
+                continue
+            written[0] += len(batch)
+        connections.close_all()
+
+    connections.close_all()
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    threads.append(threading.Thread(target=writer))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0
+    median = statistics.median(latencies) * 1000 if latencies else 0
+    print(f'{args.profile:<14} reads {len(latencies) / elapsed:8.1f}/s   median {median:8.2f} ms   '
+          f'p95 {p95:8.2f} ms   writes {written[0] / elapsed:9.1f} rows/s   lock errors {sum(errors)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=50_000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--profile', choices=sorted(PROFILES), help='run a single profile in this process')
+    args = parser.parse_args()
+
+    if args.profile:
+        return run_profile(args)
+
+    print(f'{args.size:,} cards, {args.readers} reader threads, 1 writer ({args.batch_size} rows/batch), '
+          f'{args.seconds:g}s per profile')
+    for profile, (settings_module, env) in PROFILES.items():
+        command = [sys.executable, '-m', 'benchmarks.bench_concurrency', '--profile', profile,
+                   '--size', str(args.size), '--readers', str(args.readers), '--seconds', str(args.seconds),
+                   '--batch-size', str(args.batch_size)]
+        environ = {**os.environ, **env, 'DJANGO_SETTINGS_MODULE': settings_module}
+        subprocess.run(command, env=environ, check=True)
+
+
+if __name__ == '__main__':
+    main()
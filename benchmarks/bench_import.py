@@ -0,0 +1,68 @@
+"""
+Parse-phase throughput of import_cards per worker count, one full import, and
+a sync of the same dump, which should find nothing to write.
+
+    python -m benchmarks.bench_import --cards 200000 --workers 1 2 4
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import fixture_objects, setup_django
+
+
+def write_dump(path, count):
+    """
+    An NDJSON dump of count cards cloned from the fixture, with edition codes and color names
+    """
+    objects = fixture_objects()
+    editions = {o['pk']: o['fields'] for o in objects if o['model'] == 'cards.edition'}
+    colors = {o['pk']: o['fields']['name'] for o in objects if o['model'] == 'cards.color'}
+    templates = [o['fields'] for o in objects if o['model'] == 'cards.card']
+    with open(path, 'w', encoding='utf-8') as fp:
+        for i in range(count):
+            fields = templates[i % len(templates)]
+            edition = editions[fields['edition']]
+            record = {**fields, 'name': f"{fields['name']} #{i}", 'edition': edition['code'],
+                      'edition_name': edition['name'], 'colors': [colors[pk] for pk in fields['colors']]}
+            fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cards', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--shard-size', type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    from cards import importing
+
+    dump = Path(tempfile.mkdtemp(prefix='mtgbench-')) / 'dump.ndjson'
+    write_dump(dump, args.cards)
+    shards = importing.plan_shards([dump], args.shard_size)
+    print(f'{args.cards:,} cards, {dump.stat().st_size / 1e6:.0f} MB in {len(shards)} shards')
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        rows = sum(len(result[1]) for result in importing.parse_shards(shards, workers))
+        elapsed = time.perf_counter() - start
+        print(f'parse, {workers} workers {rows / elapsed:12,.0f} cards/s ({elapsed:6.2f}s)')
+
+    start = time.perf_counter()
+    counts, _ = importing.import_dumps([dump], workers=max(args.workers), shard_size=args.shard_size)
+    elapsed = time.perf_counter() - start
+    print(f"import, {max(args.workers)} workers {counts['cards'] / elapsed:11,.0f} cards/s ({elapsed:6.2f}s)")
+
+    start = time.perf_counter()
+    counts, _ = importing.import_dumps([dump], workers=max(args.workers), shard_size=args.shard_size, sync=True)
+    elapsed = time.perf_counter() - start
+    print(f"no-change sync, {max(args.workers)} workers  {counts['unchanged']:,} unchanged ({elapsed:6.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
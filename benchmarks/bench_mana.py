@@ -0,0 +1,37 @@
+"""
+Micro-benchmarks for cards.mana.parse_mana_cost over every cost in the fixture.
+
+    python -m benchmarks.bench_mana
+"""
+import argparse
+import time
+
+from benchmarks.common import fixture_objects
+from cards.mana import parse_mana_cost
+
+
+def per_call(func, costs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for cost in costs:
+            func(cost)
+    return (time.perf_counter() - start) / (rounds * len(costs)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    costs = [obj['fields']['mana_cost'] for obj in fixture_objects() if obj['model'] == 'cards.card']
+    print(f'{len(costs)} costs, {len(set(costs))} distinct, {args.rounds} rounds')
+
+    uncached = parse_mana_cost.__wrapped__
+    print(f'parse, no memo     {per_call(uncached, costs, args.rounds):8.0f} ns/call')
+    parse_mana_cost.cache_clear()
+    print(f'parse, memoized    {per_call(parse_mana_cost, costs, args.rounds):8.0f} ns/call')
+    print(f'                   {parse_mana_cost.cache_info()}')
+
+
+if __name__ == '__main__':
+    main()
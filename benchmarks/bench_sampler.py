@@ -0,0 +1,31 @@
+"""
+Compare ORDER BY RANDOM() with cards.sampler for the homepage's 9 random cards.
+
+    python -m benchmarks.bench_sampler --sizes 10000 100000 1000000
+"""
+import argparse
+
+from benchmarks.common import format_row, measure, populate, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    from cards import sampler
+    from cards.models import Card
+
+    for size in sorted(args.sizes):
+        populate(size)
+        print(f'\n{size:,} cards')
+        print(format_row('order_by("?")[:9]', measure(lambda: list(Card.objects.order_by('?')[:9]), args.repeat)))
+        print(format_row('sampler.sample_cards(9)', measure(lambda: sampler.sample_cards(9), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare the old admin LIKE search with the FTS5 index on a replicated fixture.
+
+    python -m benchmarks.bench_search --size 120000
+"""
+import argparse
+
+from benchmarks.common import format_row, measure, populate, setup_django
+
+TERMS = ['goblin', 'dragon', 'flying', 'destroy target', 'wall def']
+# CardAdmin.search_fields before the FTS index, minus the unsearchable edition FK
+LIKE_FIELDS = ['name', 'rarity', 'type', 'text']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=120_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    from django.db.models import Q
+
+    from cards import search
+    from cards.models import Card
+
+    def like_search(term):
+        queryset = Card.objects.all()
+        for word in term.split():
+            queryset = queryset.filter(Q(*[Q(**{f'{field}__icontains': word}) for field in LIKE_FIELDS],
+                                         _connector=Q.OR))
+        return queryset
+
+    populate(args.size)
+    print(f'{Card.objects.count():,} cards')
+    for term in TERMS:
+        print(f'\n"{term}"')
+        page = Card.objects.order_by('name')
+        print(format_row('LIKE count + first 100', measure(
+            lambda: (like_search(term).count(), list(like_search(term).order_by('name')[:100])), args.repeat)))
+        print(format_row('FTS count + first 100', measure(
+            lambda: (search.filter_cards(page, term).count(), list(search.filter_cards(page, term)[:100])),
+            args.repeat)))
+        print(format_row('FTS ranked admin page', measure(
+            lambda: list(search.rank_cards(page, term).order_by('search_rank', 'name')[:100]), args.repeat)))
+        print(format_row('FTS ranked top 60 (public)', measure(
+            lambda: search.search_cards(term, Card.objects.for_listing()), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
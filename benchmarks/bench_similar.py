@@ -0,0 +1,78 @@
+"""
+Similar-card index: build time and query latency (vectorize the card, probe
+the nearest clusters, take the top k) over growing synthetic catalogues.
+
+    python -m benchmarks.bench_similar --sizes 100000 1000000
+"""
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from benchmarks.common import fixture_objects, format_row, measure, setup_django
+
+
+def template_rows():
+    """
+    A CardRow per fixture card, with its derived mana value and color identity
+    """
+    from cards import similar
+    from cards.models import Card, Color
+
+    objects = fixture_objects()
+    codes = {o['pk']: o['fields']['code'] for o in objects if o['model'] == 'cards.color'}
+    rows = []
+    for o in objects:
+        if o['model'] != 'cards.card':
+            continue
+        fields = o['fields']
+        card = Card(name=fields['name'], mana_cost=fields['mana_cost'], type=fields['type'], text=fields['text'])
+        card.refresh_derived_fields()
+        rows.append(similar.CardRow(None, '', card.name, card.type, card.text, card.mana_value,
+                                    Color.mask(codes[pk] for pk in fields['colors'])))
+    return rows
+
+
+def synthetic_rows(templates, count, seed):
+    """
+    A callable yielding the same `count` cards modelled on templates each time
+    """
+    def rows():
+        rng = random.Random(seed)
+        for _ in range(count):
+            row = rng.choice(templates)
+            yield row._replace(id=uuid.UUID(int=rng.getrandbits(128), version=4))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--limit', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from cards import similar
+
+    templates = template_rows()
+    queries = random.Random(1).sample(templates, min(len(templates), args.repeat))
+    for size in args.sizes:
+        path = Path(tempfile.mkdtemp(prefix='mtgbench-similar-'))
+        start = time.perf_counter()
+        stats = similar.write_index(path, synthetic_rows(templates, size, seed=size))
+        elapsed = time.perf_counter() - start
+        vectors_mb = (path / 'vectors.npy').stat().st_size / 1e6
+        print(f"{size:,} cards: built in {elapsed:.1f}s, {stats['clusters']} clusters, {vectors_mb:.0f} MB of vectors")
+
+        index = similar.SimilarityIndex(path)
+        cycle = iter(queries * (args.repeat // len(queries) + 2))
+        print(format_row(f'vectorize, {size:,}', measure(lambda: index.vector(next(cycle)), repeat=args.repeat)))
+        print(format_row(f'vectorize and search, {size:,}', measure(
+            lambda: index.search(index.vector(next(cycle)), args.limit), repeat=args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for the standalone benchmark scripts.
+
+Every script works on a throwaway SQLite database, so db.sqlite3 is never touched.
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from itertools import chain, cycle, islice
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FIXTURE = BASE_DIR / 'data' / 'full_fixture.json'
+
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django(db_path=None):
+    """
+    Point the default database at db_path (a temp file by default) and migrate it
+    """
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mtgcards.settings')
+    if db_path is None:
+        db_path = Path(tempfile.mkdtemp(prefix='mtgbench-')) / 'bench.sqlite3'
+    settings.DATABASES['default']['NAME'] = db_path
+    if 'replica' in settings.DATABASES:
+        settings.DATABASES['replica']['NAME'] = f'file:{db_path}?mode=ro'
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def fixture_objects():
+    with open(FIXTURE) as fp:
+        return json.load(fp)
+
+
+def populate(total, batch_size=5000):
+    """
+    Grow the cards table to `total` rows by cloning the fixture cards under new
+    ids, through CardLoader so the clones get their colors, derived columns,
+    content hashes and sample slots like loaded cards do
+    """
+    from cards import facets
+    from cards.loading import CardLoader
+    from cards.models import Card, Edition
+
+    objects = fixture_objects()
+    existing = Card.objects.count()
+    parents = [] if Edition.objects.exists() else [o for o in objects if o['model'] != 'cards.card']
+    templates = [o['fields'] for o in objects if o['model'] == 'cards.card']
+    clones = (
+        {'model': 'cards.card', 'pk': uuid.uuid4(),
+         'fields': {**fields, 'name': f"{fields['name']} #{existing + i}"}}
+        for i, fields in enumerate(islice(cycle(templates), existing, total))
+    )
+    loader = CardLoader(batch_size=batch_size, defer_facets=True)
+    existing += loader.load(chain(parents, clones))['cards']
+    facets.rebuild()
+    return existing
+
+
+def measure(func, repeat=20, warmup=3):
+    """
+    Run func warmup + repeat times and return timing stats in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'max': timings[-1],
+    }
+
+
+def format_row(label, stats):
+    return f"{label:<34} min {stats['min']:9.3f} ms   median {stats['median']:9.3f} ms   p95 {stats['p95']:9.3f} ms"
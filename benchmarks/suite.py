@@ -0,0 +1,170 @@
+"""
+Time the cards app's hot paths on synthetic catalogues and write the results as JSON.
+
+    python -m benchmarks.suite --sizes 10000 100000 --output before.json
+    python -m benchmarks.suite --sizes 10000 100000 --compare before.json
+
+Catalogues come from `manage.py generate_cards` (seeded, so every run sees the
+same data) and grow in place from one size to the next. Each benchmark gets
+warmup runs and then repeated timed runs; --compare prints the change in median
+against an earlier results file and flags anything that got slower.
+"""
+import argparse
+import io
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.common import BASE_DIR, FIXTURE, format_row, measure, setup_django
+
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+SEED = 2024
+# A median this much slower than the baseline is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmarks(client):
+    """
+    (name, function, repeat divisor) for every hot path; slow ones run fewer times
+    """
+    from django.core.cache import cache
+    from django.urls import reverse
+
+    from cards.forms import CardForm
+    from cards.loading import CardLoader, iter_json_array
+    from cards.models import Color, Edition
+
+    changelist = reverse('admin:cards_card_changelist')
+    edition = Edition.objects.order_by('pk').first()
+    color = Color.objects.order_by('pk').first()
+    saved = [0]
+
+    def get(url, params=None):
+        def run():
+            response = client.get(url, params or {})
+            assert response.status_code == 200, (url, response.status_code)
+        return run
+
+    def index_cold():
+        cache.clear()
+        get('/')()
+
+    def form_save():
+        saved[0] += 1
+        form = CardForm({'name': f'Benchmark Card {saved[0]}', 'mana_cost': '{2}{R}', 'type': 'Creature',
+                         'power': '3', 'toughness': '3', 'rarity': 'Common', 'set_name': 'Benchmark',
+                         'image_url': 'https://example.com/benchmark.jpg', 'edition': edition.pk,
+                         'colors': [color.pk]})
+        assert form.is_valid(), form.errors
+        form.save()
+
+    def fixture_load():
+        with open(FIXTURE, encoding='utf-8') as fp:
+            CardLoader(upsert=True).load(iter_json_array(fp))
+
+    return [
+        ('index, cold cache', index_cold, 1),
+        ('index, warm cache', get('/'), 1),
+        ('admin changelist', get(changelist), 1),
+        ('admin search "goblin"', get(changelist, {'q': 'goblin'}), 1),
+        ('admin filter rarity', get(changelist, {'rarity': 'Rare'}), 1),
+        ('admin filter edition+rarity', get(changelist, {'edition__id__exact': edition.pk, 'rarity': 'Rare'}), 1),
+        ('admin order by power', get(changelist, {'o': '-5'}), 1),
+        ('CardForm save', form_save, 1),
+        ('fixture load (upsert)', fixture_load, 5),
+    ]
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as fp:
+        baseline = json.load(fp)
+    before = {(row['size'], row['benchmark']): row for row in baseline['results']}
+    print(f"\nMedian vs {baseline_path} ({baseline['meta'].get('revision') or 'unknown revision'})")
+    regressions = 0
+    for row in results:
+        old = before.get((row['size'], row['benchmark']))
+        if old is None:
+            continue
+        ratio = row['median'] / old['median'] if old['median'] else float('inf')
+        flag = ''
+        if ratio > REGRESSION_THRESHOLD:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{row['size']:>9,} {row['benchmark']:<30} {old['median']:9.3f} -> {row['median']:9.3f} ms "
+              f"({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/<revision>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare medians against')
+    args = parser.parse_args()
+
+    db_path = setup_django()
+    print(f'Benchmark database: {db_path}')
+
+    import django
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+
+    from cards.models import Card
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    client = Client()
+    client.force_login(User.objects.create_superuser('bench', 'bench@example.com', 'bench'))
+
+    results = []
+    for size in sorted(args.sizes):
+        missing = size - Card.objects.count()
+        if missing > 0:
+            start = time.perf_counter()
+            call_command('generate_cards', cards=missing, seed=SEED + size, stdout=io.StringIO())
+            print(f'\n{size:,} cards (generated {missing:,} in {time.perf_counter() - start:.1f}s)')
+        for name, func, divisor in benchmarks(client):
+            stats = measure(func, repeat=max(1, args.repeat // divisor), warmup=max(1, args.warmup // divisor))
+            results.append({'size': size, 'benchmark': name, **stats})
+            print(format_row(name, stats))
+
+    revision = git_revision()
+    output = Path(args.output) if args.output else RESULTS_DIR / f'{revision or "unknown"}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    meta = {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'warmup': args.warmup,
+        'seed': SEED,
+    }
+    with open(output, 'w') as fp:
+        json.dump({'meta': meta, 'results': results}, fp, indent=2)
+    print(f'\nWrote {output}')
+
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
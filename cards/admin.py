@@ -1,14 +1,87 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 
+from cards import search
+from cards.changelist import CachedCountPaginator, CardChangeList, EditionFacetFilter, FacetListFilter
 from cards.models import Card, Edition, Color
 
 
+class StatRangeFilter(admin.SimpleListFilter):
+    """
+    Buckets a numeric power/toughness column; 'variable' is a '*' style value
+    """
+    field = None
+    ranges = [
+        ('0-1', '0 - 1', 0, 1),
+        ('2-3', '2 - 3', 2, 3),
+        ('4-5', '4 - 5', 4, 5),
+        ('6+', '6 or more', 6, None),
+    ]
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, label, low, high in self.ranges] + [('variable', 'Variable (*)')]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == 'variable':
+            source = self.field[:-len('_value')]
+            return queryset.filter(**{self.field: None}).exclude(**{source: None}).exclude(**{source: ''})
+        for key, label, low, high in self.ranges:
+            if value == key:
+                queryset = queryset.filter(**{self.field + '__gte': low})
+                if high is not None:
+                    queryset = queryset.filter(**{self.field + '__lte': high})
+                return queryset
+        return queryset
+
+
+class PowerFilter(StatRangeFilter):
+    title = 'power'
+    parameter_name = 'power'
+    field = 'power_value'
+
+
+class ToughnessFilter(StatRangeFilter):
+    title = 'toughness'
+    parameter_name = 'toughness'
+    field = 'toughness_value'
+
+
 @admin.register(Card)
 class CardAdmin(admin.ModelAdmin):
-    list_display = ['name', 'edition', 'rarity', 'type', 'power', 'toughness']
-    list_filter = ['edition', 'rarity', 'type']
-    search_fields = ['name', 'edition', 'rarity', 'type', 'text']
-    ordering = ['name']
+    list_display = ['name', 'edition', 'rarity', 'type', 'power_display', 'toughness_display']
+    list_filter = [('edition', EditionFacetFilter), ('rarity', FacetListFilter), ('type', FacetListFilter),
+                   PowerFilter, ToughnessFilter]
+    list_select_related = ['edition']
+    # Searched through the full-text index, see get_search_results
+    search_fields = search.SEARCH_FIELDS
+    # (name, pk) matches cards_card_name_id, for keyset pages; see cards.changelist
+    ordering = ['name', 'pk']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    # Filter choices already carry their counts from cards.facets
+    show_facets = admin.ShowFacets.NEVER
+
+    # Show the printed value but sort on the numeric column
+    @admin.display(description='power', ordering='power_value')
+    def power_display(self, card):
+        return card.power
+
+    @admin.display(description='toughness', ordering='toughness_value')
+    def toughness_display(self, card):
+        return card.toughness
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        queryset = search.rank_cards(queryset, search_term)
+        # Best matches first unless a column has been picked for sorting
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('search_rank', 'name', 'pk')
+        return queryset, False
+
+    def get_changelist(self, request, **kwargs):
+        return CardChangeList
 
 @admin.register(Edition)
 class EditionsAdmin(admin.ModelAdmin):
@@ -16,4 +89,4 @@ class EditionsAdmin(admin.ModelAdmin):
 
 @admin.register(Color)
 class ColorAdmin(admin.ModelAdmin):
-    list_display = ('name', 'code')
\ No newline at end of file
+    list_display = ('name', 'code')
@@ -0,0 +1,232 @@
+"""
+JSON API over the card catalogue.
+
+Pages use keyset pagination on (name, id): the cursor carries the last row
+seen, so page 1000 costs the same index seek as page 1. The export endpoint
+streams every matching card as NDJSON straight from a database iterator.
+The bulk endpoint creates a whole batch of cards in one transaction.
+"""
+import base64
+import binascii
+import csv
+import io
+import json
+import uuid
+from itertools import islice
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+
+from cards import catalogue as cards_catalogue
+from cards.forms import CardBatch
+from cards.mana import PIP_FIELDS
+from cards.models import Card, Color
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+FIELDS = ['id', 'name', 'mana_cost', 'mana_value', 'type', 'text', 'flavor', 'power', 'toughness', 'rarity',
+          'image_url', 'edition__code', 'color_identity']
+MAX_BULK_ROWS = 10000
+MANA_VALUE_FILTERS = ('mv', 'mv_min', 'mv_max')
+# Upper bound of the mana_value column, for mv_min without mv_max
+MAX_MANA_VALUE = 32767
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def encode_cursor(name, pk):
+    return base64.urlsafe_b64encode(json.dumps([name, str(pk)]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        name, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pk = uuid.UUID(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, AttributeError):
+        raise BadRequest('Invalid cursor')
+    return name, pk
+
+
+def color_codes(value):
+    codes = list(value.upper())
+    if not set(codes) <= set(Color.BITS):
+        raise BadRequest(f'Unknown color in {value!r}, use any of {"".join(Color.BITS)}')
+    return codes
+
+
+def parse_filters(params):
+    """
+    The query string filters, validated:
+        edition=10E,9ED   edition codes
+        rarity=Rare       exact rarity
+        type=Creature     type line prefix
+        color=UR          contains all these colors
+        identity=R        exactly these colors ('' for colorless)
+        mv=3              mana value, or a range with mv_min / mv_max
+        pips=RR           at least these colored pips, e.g. two red
+    """
+    filters = {}
+    if params.get('edition'):
+        filters['editions'] = params['edition'].split(',')
+    if params.get('rarity'):
+        filters['rarity'] = params['rarity']
+    if params.get('type'):
+        filters['type'] = params['type']
+    if params.get('color'):
+        filters['colors'] = color_codes(params['color'])
+    if 'identity' in params:
+        filters['identity'] = color_codes(params['identity'])
+    for param in MANA_VALUE_FILTERS:
+        if params.get(param):
+            filters[param] = int(params[param])
+    if params.get('pips'):
+        codes = color_codes(params['pips'])
+        filters['pips'] = {code: codes.count(code) for code in set(codes)}
+    return filters
+
+
+def type_prefix(prefix):
+    """
+    Type lines starting with prefix, ignoring case, as a range on the
+    LOWER(type) index: a LIKE would walk every card
+    """
+    prefix = prefix.lower()
+    return Q(type_lower__gte=prefix, type_lower__lt=prefix + '\U0010ffff')
+
+
+def filter_cards(filters):
+    """
+    Card queryset for parse_filters() output
+    """
+    cards = Card.objects.alias(type_lower=Lower('type'))
+    if 'editions' in filters:
+        cards = cards.filter(edition__code__in=filters['editions'])
+    if 'rarity' in filters:
+        cards = cards.filter(rarity=filters['rarity'])
+    if 'type' in filters:
+        cards = cards.filter(type_prefix(filters['type']))
+    if 'colors' in filters:
+        cards = cards.with_colors(*filters['colors'])
+    if 'identity' in filters:
+        cards = cards.with_exact_colors(*filters['identity'])
+    if 'mv' in filters:
+        cards = cards.filter(mana_value=filters['mv'])
+    if 'mv_min' in filters or 'mv_max' in filters:
+        # Always both bounds: given one, SQLite walks the name index rather than seek the mana value one
+        cards = cards.filter(mana_value__range=(filters.get('mv_min', 0), filters.get('mv_max', MAX_MANA_VALUE)))
+    if 'pips' in filters:
+        cards = cards.filter(**{f'{PIP_FIELDS[code]}__gte': count for code, count in filters['pips'].items()})
+    return cards
+
+
+def serialize(row):
+    row = dict(row)
+    row['id'] = str(row['id'])
+    row['edition'] = row.pop('edition__code')
+    row['colors'] = Color.codes(row.pop('color_identity'))
+    return row
+
+
+def serialize_record(record):
+    """
+    serialize() for a cards.catalogue record
+    """
+    row = {field: getattr(record, field) for field in FIELDS if field != 'edition__code'}
+    row['edition__code'] = record.edition.code
+    return serialize(row)
+
+
+def bad_request(error):
+    return JsonResponse({'error': str(error)}, status=400)
+
+
+def card_list(request):
+    try:
+        filters = parse_filters(request.GET)
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise BadRequest('limit must be positive')
+        cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as error:
+        return bad_request(error)
+
+    # One row past the page tells us whether there is a next page
+    catalogue = cards_catalogue.current()
+    if catalogue is not None:
+        rows = [serialize_record(record) for record in islice(catalogue.select(filters, cursor), limit + 1)]
+    else:
+        cards = filter_cards(filters)
+        if cursor:
+            name, pk = cursor
+            cards = cards.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+        rows = [serialize(row) for row in cards.order_by('name', 'id').values(*FIELDS)[:limit + 1]]
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(rows[-1]['name'], rows[-1]['id'])
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return JsonResponse({'results': rows, 'next': next_url})
+
+
+def card_export(request):
+    try:
+        filters = parse_filters(request.GET)
+    except ValueError as error:
+        return bad_request(error)
+
+    catalogue = cards_catalogue.current()
+    if catalogue is not None:
+        rows = map(serialize_record, catalogue.select(filters))
+    else:
+        cards = filter_cards(filters).order_by('name', 'id')
+        rows = map(serialize, cards.values(*FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    lines = (json.dumps(row) + '\n' for row in rows)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="cards.ndjson"'
+    return response
+
+
+def read_batch(request):
+    """
+    Rows of a bulk upload: a JSON list of card objects (or {"cards": [...]}),
+    or CSV with a header row. Both use the field names of CardForm.
+    """
+    if request.content_type == 'text/csv':
+        rows = list(csv.DictReader(io.StringIO(request.body.decode('utf-8-sig'))))
+    elif request.content_type == 'application/json':
+        rows = json.loads(request.body)
+        if isinstance(rows, dict):
+            rows = rows.get('cards')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise BadRequest('Expected a list of card objects')
+    else:
+        raise BadRequest('Send the batch as application/json or text/csv')
+    if not rows:
+        raise BadRequest('The batch is empty')
+    if len(rows) > MAX_BULK_ROWS:
+        raise BadRequest(f'At most {MAX_BULK_ROWS} cards per batch')
+    return rows
+
+
+@require_POST
+def card_bulk(request):
+    if not request.user.has_perm('cards.add_card'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    try:
+        batch = CardBatch(read_batch(request))
+    except ValueError as error:
+        return bad_request(error)
+
+    # All or nothing: any invalid row rejects the batch
+    if not batch.is_valid():
+        return JsonResponse({'created': 0, 'errors': batch.errors}, status=400)
+    ids = batch.save()
+    return JsonResponse({'created': len(ids), 'ids': [str(pk) for pk in ids]}, status=201)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from cards import api
+
+app_name = 'cards-api'
+
+urlpatterns = [
+    path('', api.card_list, name='list'),
+    path('export/', api.card_export, name='export'),
+    path('bulk/', api.card_bulk, name='bulk'),
+]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CardsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cards'
+
+    def ready(self):
+        from cards import checks, signals  # noqa: F401
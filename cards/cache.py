@@ -0,0 +1,231 @@
+"""
+Versioned caching for card pages.
+
+Cached entries (rendered card tiles, CardForm choice lists) are stored under
+keys that embed the current version of every object they were built from.
+The signal handlers in cards.signals bump those versions on save and delete,
+so a changed object's entries are never looked up again and simply expire,
+while everything else stays warm.
+
+Versions live in the cache too. A version that has been evicted comes back as
+a brand-new token rather than an old value, so eviction can only cause a miss,
+never a stale hit.
+
+Invalidation only reaches the processes that share the cache. With the default
+per-process LocMemCache, the bumps made by management commands (load_cards,
+import_cards, generate_cards, fetch_images, which write with bulk_create and
+invalidate here themselves) stay in the command's own memory: web workers keep
+serving their cached tiles and choice lists for up to TILE_TIMEOUT and
+CHOICES_TIMEOUT, or until they restart. Run those commands against a shared
+cache (MTGCARDS_CACHE_DIR) when the server is up.
+
+The a-prefixed functions are the same lookups for async views.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from cards.models import Card
+
+KEY_PREFIX = 'cards'
+TILE_TIMEOUT = 60 * 60 * 24
+CHOICES_TIMEOUT = 60 * 60 * 24
+COUNT_TIMEOUT = 60 * 60
+
+# Backends that never block on I/O, so async code can call them directly
+IN_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(kind, hits=0, misses=0):
+    with _stats_lock:
+        _stats[f'{kind}_hits'] += hits
+        _stats[f'{kind}_misses'] += misses
+
+
+def stats():
+    """
+    Hit/miss counters for this process since start (or the last reset_stats())
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def version_key(kind, pk=None):
+    return f'{KEY_PREFIX}:version:{kind}' if pk is None else f'{KEY_PREFIX}:version:{kind}:{pk}'
+
+
+# Bumped by every invalidation, for cards.catalogue and cached counts
+CATALOGUE_VERSION = version_key('catalogue')
+
+
+def new_version():
+    return format(time.time_ns(), 'x')
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in set(keys) - set(versions):
+        cache.add(key, new_version(), None)
+        versions[key] = cache.get(key)
+    return versions
+
+
+async def run_cache(func, *args):
+    """
+    Call a sync cache helper from async code: inline for in-memory backends,
+    otherwise in one sync_to_async hop (the stock a* methods hop once per key)
+    """
+    if isinstance(caches['default'], IN_PROCESS_BACKENDS):
+        return func(*args)
+    return await sync_to_async(func)(*args)
+
+
+def bump(*keys):
+    cache.set_many({key: new_version() for key in keys}, None)
+
+
+def invalidate_cards(pks):
+    bump(*[version_key('card', pk) for pk in pks], CATALOGUE_VERSION)
+
+
+def invalidate_card(pk):
+    invalidate_cards([pk])
+
+
+def invalidate_editions(pks):
+    # Tiles show the edition, and the edition list feeds CardForm
+    bump(*[version_key('edition', pk) for pk in pks], version_key('editions'), CATALOGUE_VERSION)
+
+
+def invalidate_edition(pk):
+    invalidate_editions([pk])
+
+
+def invalidate_colors():
+    bump(version_key('colors'), CATALOGUE_VERSION)
+
+
+def invalidate_catalogue():
+    bump(CATALOGUE_VERSION)
+
+
+def tile_key(card, versions):
+    card_version = versions[version_key('card', card.pk)]
+    edition_version = versions[version_key('edition', card.edition_id)]
+    return f'{KEY_PREFIX}:tile:{card.pk}:{card_version}:{card.edition_id}:{edition_version}'
+
+
+def tile_keys(cards):
+    keys = [version_key('card', card.pk) for card in cards]
+    keys += [version_key('edition', card.edition_id) for card in cards]
+    versions = get_versions(keys)
+    return [tile_key(card, versions) for card in cards]
+
+
+def missing_tiles(cards, keys, tiles):
+    missing = [card.pk for card, key in zip(cards, keys) if key not in tiles]
+    record('tiles', hits=len(cards) - len(missing), misses=len(missing))
+    return missing
+
+
+def render_fresh(cards, keys, loaded):
+    return {
+        key: render_to_string('cards/card_tile.html', {'card': loaded[card.pk]})
+        for card, key in zip(cards, keys) if card.pk in loaded
+    }
+
+
+def render_tiles(cards, source=None):
+    """
+    Rendered HTML for each card, in order. cards only need pk and edition_id
+    loaded; cards whose tile is not cached are fetched with for_listing(), or
+    from source's in_bulk() (e.g. a cards.catalogue.Catalogue) if given.
+    """
+    keys = tile_keys(cards)
+    tiles = cache.get_many(keys)
+    missing = missing_tiles(cards, keys, tiles)
+    if missing:
+        source = Card.objects.for_listing() if source is None else source
+        fresh = render_fresh(cards, keys, source.in_bulk(missing))
+        cache.set_many(fresh, TILE_TIMEOUT)
+        tiles.update(fresh)
+    return [mark_safe(tiles[key]) for key in keys if key in tiles]
+
+
+async def arender_tiles(cards, source=None):
+    keys = await run_cache(tile_keys, cards)
+    tiles = await run_cache(cache.get_many, keys)
+    missing = missing_tiles(cards, keys, tiles)
+    if missing:
+        loaded = source.in_bulk(missing) if source is not None else await Card.objects.for_listing().ain_bulk(missing)
+        fresh = render_fresh(cards, keys, loaded)
+        await run_cache(cache.set_many, fresh, TILE_TIMEOUT)
+        tiles.update(fresh)
+    return [mark_safe(tiles[key]) for key in keys if key in tiles]
+
+
+def choices_key(kind):
+    version = get_versions([version_key(kind)])[version_key(kind)]
+    return f'{KEY_PREFIX}:form-choices:{kind}:{version}'
+
+
+def cached_choices(kind, build):
+    key = choices_key(kind)
+    choices = cache.get(key)
+    if choices is None:
+        record('choices', misses=1)
+        choices = build()
+        cache.set(key, choices, CHOICES_TIMEOUT)
+    else:
+        record('choices', hits=1)
+    return choices
+
+
+async def acached_choices(kind, build):
+    key = await run_cache(choices_key, kind)
+    choices = await run_cache(cache.get, key)
+    if choices is None:
+        record('choices', misses=1)
+        choices = await build()
+        await run_cache(cache.set, key, choices, CHOICES_TIMEOUT)
+    else:
+        record('choices', hits=1)
+    return choices
+
+
+def count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{sql}{params!r}'.encode()).hexdigest()
+    version = get_versions([CATALOGUE_VERSION])[CATALOGUE_VERSION]
+    return f'{KEY_PREFIX}:count:{digest}:{version}'
+
+
+def cached_count(queryset):
+    """
+    queryset.count(), cached until any card, edition or color changes
+    """
+    key = count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        record('counts', misses=1)
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    else:
+        record('counts', hits=1)
+    return count
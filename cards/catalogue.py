@@ -0,0 +1,321 @@
+"""
+Optional in-memory copy of the card catalogue for read-heavy paths.
+
+With CARDS_MEMORY_CATALOGUE on, the index view, search and the JSON API read
+from an immutable Catalogue instead of the database: compact __slots__ records
+in (name, id) order plus prebuilt indexes by name, edition, rarity, type, color
+identity and search token, whose posting lists are sorted array('I')s of record
+positions. Results therefore come out in the same (name, id) order as the SQL
+paths and need no sorting.
+
+The catalogue is built in a background thread the first time it is asked for
+and tagged with the cards.cache 'catalogue' version read before building. The
+invalidate_* functions there bump that version on every Card, Edition or Color
+change (signals and bulk loads alike). current() returns the catalogue only
+while its version is still current; otherwise it starts a rebuild and returns
+None, so callers fall back to SQL until the new catalogue is swapped in with a
+single assignment.
+
+That keeps the catalogue from being served stale only if every process that
+changes cards shares the cache with the web workers. With the default
+per-process LocMemCache, changes made by management commands (load_cards,
+import_cards, generate_cards, fetch_images) bump versions in the command's
+own memory and the web workers keep their catalogue until they restart;
+check cards.W001 warns about that combination. Search results are ranked by
+the same bm25() as the FTS5 path, see Catalogue.search().
+"""
+import bisect
+import logging
+import math
+import random
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection
+
+from cards.cache import CATALOGUE_VERSION, get_versions, run_cache
+from cards.mana import PIP_FIELDS
+from cards.models import Card, Color, Edition
+
+logger = logging.getLogger(__name__)
+
+CARD_FIELDS = ('id', 'name', 'mana_cost', 'mana_value', 'type', 'text', 'flavor', 'power', 'toughness', 'rarity',
+               'set_name', 'image_url', 'edition_id', 'color_identity', *PIP_FIELDS.values())
+EDITION_COLUMN = CARD_FIELDS.index('edition_id')
+BUILD_CHUNK_SIZE = 5000
+# Same columns and weights as the FTS5 search, see cards.search
+SEARCH_FIELDS = ('name', 'type', 'text', 'flavor')
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0, 0.5)
+# FTS5's built-in bm25() parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+WORD_RE = re.compile(r'[^\W_]+')
+
+_current = None
+_reloading = None
+_reload_lock = threading.Lock()
+
+
+def bm25_idf(rows, hits):
+    """
+    FTS5's bm25() inverse document frequency of a phrase found in hits of rows rows
+    """
+    idf = math.log((rows - hits + 0.5) / (hits + 0.5))
+    return idf if idf > 0 else 1e-6
+
+
+def tokens(text):
+    """
+    Lowercased words without diacritics, as FTS5's unicode61 tokenizer splits them
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD_RE.findall(text)
+
+
+class EditionRecord:
+    __slots__ = ('id', 'name', 'code')
+
+    def __init__(self, id, name, code):
+        self.id = id
+        self.name = name
+        self.code = code
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return f"{self.name}({self.code})"
+
+
+class CardRecord:
+    """
+    The Card fields pages and the API read, plus the edition record
+    """
+    __slots__ = (*CARD_FIELDS, 'edition')
+
+    def __init__(self, values, edition):
+        for name, value in zip(CARD_FIELDS, values):
+            setattr(self, name, value)
+        self.edition = edition
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+def postings(positions):
+    return array('I', positions)
+
+
+class Catalogue:
+    def __init__(self, records, version=None):
+        self.version = version
+        self.records = records
+        self.keys = [(record.name, record.id) for record in records]
+        self.by_id = {record.id: record for record in records}
+
+        by_name, by_edition, by_rarity, by_identity = (defaultdict(list) for _ in range(4))
+        words = [defaultdict(list) for _ in SEARCH_FIELDS]
+        counts = [defaultdict(list) for _ in SEARCH_FIELDS]
+        # Tokens per record over every search field, bm25's document length
+        self.lengths = array('I')
+        for position, record in enumerate(records):
+            by_name[record.name.lower()].append(position)
+            by_edition[record.edition.code].append(position)
+            by_rarity[record.rarity].append(position)
+            by_identity[record.color_identity].append(position)
+            length = 0
+            for field, index, count_index in zip(SEARCH_FIELDS, words, counts):
+                field_tokens = tokens(getattr(record, field) or '')
+                length += len(field_tokens)
+                for token, count in Counter(field_tokens).items():
+                    index[token].append(position)
+                    count_index[token].append(count)
+            self.lengths.append(length)
+        self.average_length = sum(self.lengths) / len(records) if records else 0.0
+        self.by_name = {key: postings(value) for key, value in by_name.items()}
+        self.by_edition = {key: postings(value) for key, value in by_edition.items()}
+        self.by_rarity = {key: postings(value) for key, value in by_rarity.items()}
+        self.by_identity = {key: postings(value) for key, value in by_identity.items()}
+        # Type lines sorted, so a prefix is a bisect range
+        self.types = sorted((record.type.lower(), position) for position, record in enumerate(records))
+        self.type_keys = [type_line for type_line, _ in self.types]
+        self.words = [{token: postings(value) for token, value in index.items()} for index in words]
+        # How often each token occurs in each record of its postings, in the same order
+        self.word_counts = [{token: array('H', value) for token, value in index.items()} for index in counts]
+        self.word_keys = [sorted(index) for index in self.words]
+
+    @classmethod
+    def build(cls, version=None):
+        editions = {pk: EditionRecord(pk, name, code)
+                    for pk, name, code in Edition.objects.values_list('pk', 'name', 'code')}
+        rows = Card.objects.order_by('name', 'id').values_list(*CARD_FIELDS).iterator(chunk_size=BUILD_CHUNK_SIZE)
+        return cls([CardRecord(row, editions[row[EDITION_COLUMN]]) for row in rows], version)
+
+    def __len__(self):
+        return len(self.records)
+
+    def in_bulk(self, pks):
+        return {pk: self.by_id[pk] for pk in pks if pk in self.by_id}
+
+    def named(self, name):
+        return [self.records[position] for position in self.by_name.get(name.lower(), ())]
+
+    def sample(self, k):
+        return random.sample(self.records, min(k, len(self.records)))
+
+    def type_range(self, prefix):
+        # Case-insensitive, like type__startswith on SQLite
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.type_keys, prefix)
+        return start, bisect.bisect_left(self.type_keys, prefix + '\U0010ffff', start)
+
+    def lookups(self, filters):
+        """
+        (size, positions, check) per indexed filter: positions builds its
+        posting list and check(record) tests a record against the filter
+        """
+        if 'editions' in filters:
+            codes = set(filters['editions'])
+            lists = [self.by_edition[code] for code in codes if code in self.by_edition]
+            yield (sum(map(len, lists)), lambda: sorted(chain(*lists)),
+                   lambda record: record.edition.code in codes)
+        if 'rarity' in filters:
+            rarity = filters['rarity']
+            positions = self.by_rarity.get(rarity, ())
+            yield len(positions), lambda: positions, lambda record: record.rarity == rarity
+        if 'type' in filters:
+            start, end = self.type_range(filters['type'])
+            prefix = filters['type'].lower()
+            yield (end - start, lambda: sorted(position for _, position in self.types[start:end]),
+                   lambda record: record.type.lower().startswith(prefix))
+        if 'identity' in filters:
+            identity = Color.mask(filters['identity'])
+            positions = self.by_identity.get(identity, ())
+            yield len(positions), lambda: positions, lambda record: record.color_identity == identity
+        if 'colors' in filters:
+            mask = Color.mask(filters['colors'])
+            lists = [positions for identity, positions in self.by_identity.items() if identity & mask == mask]
+            yield (sum(map(len, lists)), lambda: sorted(chain(*lists)),
+                   lambda record: record.color_identity & mask == mask)
+
+    def select(self, filters, after=None):
+        """
+        Records matching cards.api.parse_filters() output, in (name, id) order,
+        starting after the (name, id) cursor if given
+        """
+        start = bisect.bisect_right(self.keys, after) if after is not None else 0
+        lookups = sorted(self.lookups(filters), key=lambda lookup: lookup[0])
+        checks = [check for _, _, check in lookups[1:]]
+        if lookups:
+            # Walk the smallest posting list; the other filters are cheap per-record checks
+            positions = lookups[0][1]()
+            positions = positions[bisect.bisect_left(positions, start):]
+        else:
+            positions = range(start, len(self.records))
+
+        if 'mv' in filters:
+            checks.append(lambda record: record.mana_value == filters['mv'])
+        if 'mv_min' in filters:
+            checks.append(lambda record: record.mana_value >= filters['mv_min'])
+        if 'mv_max' in filters:
+            checks.append(lambda record: record.mana_value <= filters['mv_max'])
+        for code, count in filters.get('pips', {}).items():
+            checks.append(lambda record, field=PIP_FIELDS[code], count=count: getattr(record, field) >= count)
+        for position in positions:
+            record = self.records[position]
+            if all(check(record) for check in checks):
+                yield record
+
+    def search(self, query, limit):
+        """
+        Records with every word of query as a prefix of a word in their name, type,
+        text or flavor, ranked like the FTS5 search: bm25() with the same column
+        weights, then name
+        """
+        phrases = []
+        for token in tokens(query):
+            # Weighted occurrences of the prefix in each record that has it
+            frequencies = defaultdict(float)
+            for weight, index, counts, keys in zip(SEARCH_WEIGHTS, self.words, self.word_counts, self.word_keys):
+                start = bisect.bisect_left(keys, token)
+                end = bisect.bisect_left(keys, token + '\U0010ffff', start)
+                for word in keys[start:end]:
+                    for position, count in zip(index[word], counts[word]):
+                        frequencies[position] += weight * count
+            if not frequencies:
+                return []
+            phrases.append(frequencies)
+        if not phrases:
+            return []
+
+        matches = set(min(phrases, key=len)).intersection(*phrases)
+        scores = dict.fromkeys(matches, 0.0)
+        for frequencies in phrases:
+            idf = bm25_idf(len(self.records), len(frequencies))
+            for position in matches:
+                frequency = frequencies[position]
+                norm = 1 - BM25_B + BM25_B * self.lengths[position] / self.average_length
+                scores[position] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * norm)
+        # Positions are in (name, id) order, so they break score ties like the SQL ORDER BY
+        ranked = sorted(scores, key=lambda position: (-scores[position], position))
+        return [self.records[position] for position in ranked[:limit]]
+
+
+def reload():
+    """
+    Build a catalogue from the database and make it the current one
+    """
+    global _current
+    # The version first: a change made while building leaves this catalogue already outdated
+    version = get_versions([CATALOGUE_VERSION])[CATALOGUE_VERSION]
+    catalogue = Catalogue.build(version)
+    _current = catalogue
+    return catalogue
+
+
+def reload_in_background():
+    try:
+        reload()
+    except Exception:
+        logger.exception('Building the in-memory catalogue failed')
+    finally:
+        connection.close()
+
+
+def start_reload():
+    global _reloading
+    with _reload_lock:
+        if _reloading is None or not _reloading.is_alive():
+            _reloading = threading.Thread(target=reload_in_background, name='catalogue-reload', daemon=True)
+            _reloading.start()
+
+
+def current():
+    """
+    The in-memory catalogue if it is enabled and up to date, else None (use SQL)
+    """
+    if not settings.CARDS_MEMORY_CATALOGUE:
+        return None
+    catalogue = _current
+    version = get_versions([CATALOGUE_VERSION])[CATALOGUE_VERSION]
+    if catalogue is not None and catalogue.version == version:
+        return catalogue
+    start_reload()
+    return None
+
+
+async def acurrent():
+    if not settings.CARDS_MEMORY_CATALOGUE:
+        return None
+    return await run_cache(current)
@@ -0,0 +1,190 @@
+"""
+Card admin changelist for large catalogues.
+
+The stock changelist runs a COUNT(*) for the paginator and another for the
+unfiltered total, pages with OFFSET and lists type filter choices with a
+SELECT DISTINCT over every card. Here:
+
+- filter choices for edition, rarity and type come with their counts from
+  the cards.facets table;
+- the result count comes from that table when at most one of those filters
+  is applied (and nothing else), otherwise from a COUNT(*) cached until the
+  catalogue changes; the unfiltered total is not shown;
+- when the ordering is on plain NOT NULL columns ending in the pk (the
+  default (name, pk) included), pages are keyset pages: the cursor carries
+  the last row shown, so every page is the same index seek. Other orderings,
+  such as search relevance, keep the numbered OFFSET pages.
+"""
+import base64
+import binascii
+import json
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.utils import get_last_value_from_parameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from cards import cache, facets
+from cards.models import Card, Edition
+
+CURSOR_VAR = 'cursor'
+# Columns a keyset can seek on: indexed with name, and never NULL
+KEYSET_FIELDS = {'name', 'rarity', 'type', 'pk', 'id'}
+
+
+class FacetListFilter(admin.FieldListFilter):
+    """
+    The values of a cards.facets facet with their card counts, read from the
+    facet table rather than from the cards
+    """
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.facet = field_path
+        self.lookup_kwarg = self.get_lookup_kwarg(field_path)
+        self.lookup_val = get_last_value_from_parameters(params, self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def get_lookup_kwarg(self, field_path):
+        return field_path
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def labels(self, values):
+        return {value: value for value in sorted(values)}
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': 'All',
+        }
+        counts = facets.counts(self.facet)
+        for value, label in self.labels(counts).items():
+            yield {
+                'selected': self.lookup_val == value,
+                'query_string': changelist.get_query_string({self.lookup_kwarg: value}),
+                'display': f'{label} ({counts[value]})',
+            }
+
+
+class EditionFacetFilter(FacetListFilter):
+    def get_lookup_kwarg(self, field_path):
+        # Same parameter as the stock related field filter
+        return f'{field_path}__id__exact'
+
+    def labels(self, values):
+        editions = Edition.objects.filter(pk__in=[int(value) for value in values])
+        return {str(edition.pk): str(edition) for edition in editions}
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        # The unfiltered total is kept in the facet table, unlike a COUNT(*) over every card
+        if self.object_list.model is Card and not self.object_list.query.where:
+            return facets.total()
+        return cache.cached_count(self.object_list)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps([str(value) for value in values]).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise IncorrectLookupParameters('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise IncorrectLookupParameters('Invalid cursor')
+    return values
+
+
+def seek(ordering, values):
+    """
+    Rows after values in ordering, e.g. name > a OR (name = a AND pk > b)
+    """
+    condition = Q()
+    equal = {}
+    for part, value in zip(ordering, values):
+        field = part.lstrip('-')
+        condition |= Q(**equal, **{f'{field}__{"lt" if part.startswith("-") else "gt"}': value})
+        equal[field] = value
+    return condition
+
+
+class CardChangeList(ChangeList):
+    keyset = False
+    next_page_query = None
+    first_page_query = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # A cursor only makes sense for the ordering and filters it came from
+        if CURSOR_VAR not in (new_params or {}):
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def keyset_ordering(self):
+        ordering = self.queryset.query.order_by
+        if self.show_all or not ordering:
+            return None
+        if not all(isinstance(part, str) and part.lstrip('-') in KEYSET_FIELDS for part in ordering):
+            return None
+        # The pk last makes the ordering total
+        return list(ordering) if ordering[-1].lstrip('-') in ('pk', 'id') else None
+
+    def precomputed_count(self):
+        """
+        The result count from cards.facets, or None if the filters need a real count
+        """
+        if self.query:
+            return None
+        facet_params = {spec.lookup_kwarg: spec.facet for spec in self.filter_specs
+                        if isinstance(spec, FacetListFilter)}
+        selected = {}
+        for param, values in self.get_filters_params().items():
+            if param not in facet_params or len(values) != 1:
+                return None
+            selected[facet_params[param]] = values[0]
+        return facets.count(selected)
+
+    def get_results(self, request):
+        ordering = self.keyset_ordering()
+        if ordering is None:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            queryset = queryset.filter(seek(ordering, decode_cursor(cursor, len(ordering))))
+        # One row past the page tells us whether there is a next page
+        rows = list(queryset[:self.list_per_page + 1])
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        count = self.precomputed_count()
+        if count is not None:
+            paginator.count = count
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            last = [getattr(rows[-1], part.lstrip('-')) for part in ordering]
+            self.next_page_query = self.get_query_string({CURSOR_VAR: encode_cursor(last)})
+        if cursor:
+            self.first_page_query = self.get_query_string()
+
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(cursor or self.next_page_query)
+        self.paginator = paginator
@@ -0,0 +1,24 @@
+"""
+System checks for settings that only work in combination
+"""
+from django.conf import settings
+from django.core import checks
+
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@checks.register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The in-memory catalogue learns of changes through cache versions, which a
+    per-process cache keeps from the web workers when a management command
+    makes the change
+    """
+    if settings.CARDS_MEMORY_CATALOGUE and settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [checks.Warning(
+            'CARDS_MEMORY_CATALOGUE is on with a per-process cache',
+            hint='Cards changed by load_cards, import_cards, generate_cards or fetch_images stay out of the '
+                 'web workers\' catalogues until they restart. Share the cache, e.g. with MTGCARDS_CACHE_DIR.',
+            id='cards.W001',
+        )]
+    return []
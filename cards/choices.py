@@ -0,0 +1,50 @@
+"""
+Choice providers for CardForm's edition and colors fields.
+
+A provider serves the (value, label) pairs together with their rendered
+<option> markup from the versioned cache in cards.cache, so a warm form page
+runs no catalogue queries and renders no per-option templates. Saving or
+deleting an Edition or Color bumps the version (see cards.signals) and the
+next form rebuilds both.
+"""
+from typing import NamedTuple
+
+from django.utils.html import format_html_join
+
+from cards import cache
+from cards.models import Color, Edition
+
+
+class Choices(NamedTuple):
+    choices: list
+    # <option> elements for choices, none of them selected
+    options: str
+
+
+def render_options(choices):
+    return str(format_html_join('', '<option value="{}">{}</option>', choices))
+
+
+class ChoiceProvider:
+    def __init__(self, kind, model):
+        self.kind = kind
+        self.model = model
+
+    def build(self):
+        choices = [(obj.pk, str(obj)) for obj in self.model.objects.all()]
+        return Choices(choices, render_options(choices))
+
+    async def abuild(self):
+        choices = [(obj.pk, str(obj)) async for obj in self.model.objects.all()]
+        return Choices(choices, render_options(choices))
+
+    def get(self):
+        return cache.cached_choices(self.kind, self.build)
+
+    async def aget(self):
+        return await cache.acached_choices(self.kind, self.abuild)
+
+
+# The kinds match the version keys bumped by cache.invalidate_editions/colors
+EDITIONS = ChoiceProvider('editions', Edition)
+COLORS = ChoiceProvider('colors', Color)
@@ -0,0 +1,120 @@
+"""
+Streaming catalogue exports for `manage.py export_cards`.
+
+Cards are read with values_list() through a database iterator, chunk_size rows
+at a time, so memory stays bounded by the chunk size whatever the catalogue
+size. Edition codes and color codes come from an in-memory edition map and the
+color_identity mask rather than joins, and each chunk is written out as NDJSON,
+CSV or a columnar snapshot (cards.snapshot) before the next is read.
+
+export_shards() writes one file per edition from a pool of worker processes,
+since encoding rows is CPU-bound Python that threads would serialize on the GIL.
+"""
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.db import connections
+
+from cards.models import Card, Color, Edition
+from cards.snapshot import SOURCE_FIELDS, TEXT_COLUMNS, SnapshotWriter
+
+CHUNK_SIZE = 2000
+EXTENSIONS = {'ndjson': 'ndjson', 'csv': 'csv', 'snapshot': 'snap'}
+CSV_COLUMNS = ['id', *TEXT_COLUMNS, 'edition', 'colors']
+
+
+def card_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    values_list(*SOURCE_FIELDS) rows of queryset, in lists of up to chunk_size
+    """
+    chunk = []
+    for row in queryset.values_list(*SOURCE_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def card_record(row, edition_codes):
+    pk, edition_id, mask, *texts = row
+    record = {'id': str(pk), **dict(zip(TEXT_COLUMNS, texts))}
+    record['edition'] = edition_codes[edition_id]
+    record['colors'] = Color.codes(mask)
+    return record
+
+
+def write_ndjson(fp, queryset, editions, chunk_size):
+    codes = {edition.pk: edition.code for edition in editions}
+    count = 0
+    for rows in card_rows(queryset, chunk_size):
+        fp.write(''.join(json.dumps(card_record(row, codes), ensure_ascii=False) + '\n' for row in rows))
+        count += len(rows)
+    return count
+
+
+def write_csv(fp, queryset, editions, chunk_size):
+    codes = {edition.pk: edition.code for edition in editions}
+    writer = csv.writer(fp)
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for rows in card_rows(queryset, chunk_size):
+        writer.writerows([str(pk), *texts, codes[edition_id], ''.join(Color.codes(mask))]
+                         for pk, edition_id, mask, *texts in rows)
+        count += len(rows)
+    return count
+
+
+def write_snapshot(fp, queryset, editions, chunk_size):
+    writer = SnapshotWriter(fp, editions)
+    count = 0
+    for rows in card_rows(queryset, chunk_size):
+        writer.write_rows(rows)
+        count += len(rows)
+    writer.close()
+    return count
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv, 'snapshot': write_snapshot}
+
+
+def open_output(path, fmt):
+    if fmt == 'snapshot':
+        return open(path, 'wb')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def export(path, fmt, queryset=None, editions=None, chunk_size=CHUNK_SIZE):
+    """
+    Write queryset (every card by default) to path and return the card count
+    """
+    queryset = Card.objects.order_by('name', 'id') if queryset is None else queryset
+    editions = list(Edition.objects.order_by('pk') if editions is None else editions)
+    with open_output(path, fmt) as fp:
+        return WRITERS[fmt](fp, queryset, editions, chunk_size)
+
+
+def export_edition(directory, fmt, edition, chunk_size):
+    path = Path(directory) / f'{edition.code}.{EXTENSIONS[fmt]}'
+    return edition.code, export(path, fmt, Card.objects.filter(edition=edition).order_by('name', 'id'),
+                                [edition], chunk_size)
+
+
+def export_shards(directory, fmt, editions=None, chunk_size=CHUNK_SIZE, workers=4):
+    """
+    Write each edition's cards to <directory>/<code>.<ext> and return the count per code
+    """
+    editions = list(Edition.objects.order_by('code') if editions is None else editions)
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    if workers <= 1:
+        return dict(export_edition(directory, fmt, edition, chunk_size) for edition in editions)
+
+    # Forked workers must not share this process's connections; they open their own
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        jobs = [executor.submit(export_edition, directory, fmt, edition, chunk_size) for edition in editions]
+        return dict(job.result() for job in jobs)
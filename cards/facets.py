@@ -0,0 +1,271 @@
+"""
+Precomputed card counts for the admin filters and the browse page.
+
+FacetCount holds one row per edition, rarity and type line, so the admin can
+list filter choices with their counts, and count an unfiltered or
+single-filter changelist, from a table of a few hundred rows instead of a
+GROUP BY or COUNT(*) over every card.
+
+FacetCombinationCount serves the browse page, which narrows cards by
+edition, rarity, card type (the type line before its subtype) and color.
+For every combination of those facets and every facet in it, it counts the
+cards per value of that facet among the cards matching each set of values of
+the others. Any filter combination is then one seek on the unique index per
+facet, returning just the values to show, however many cards there are.
+Colors are multi-valued: a red-green card counts under both R and G, and
+colorless cards under C.
+
+The signal handlers in cards.signals move a card between values as it is
+saved, deleted or recolored, and CardLoader applies the changes of each bulk
+batch, all through keys_changed(). `manage.py rebuild_facets` recounts both
+tables from scratch.
+"""
+from collections import Counter, namedtuple
+from itertools import combinations, product
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from cards.models import Card, Color, FacetCombinationCount, FacetCount
+
+# Facet name -> Card column, for FacetCount
+FACETS = {'edition': 'edition_id', 'rarity': 'rarity', 'type': 'type'}
+
+# Browse facets, in the order they appear in FacetCombinationCount keys
+BROWSE_FACETS = ('edition', 'rarity', 'type', 'color')
+COMBINATIONS = [combination for size in range(1, len(BROWSE_FACETS) + 1)
+                for combination in combinations(BROWSE_FACETS, size)]
+COLORLESS = 'C'
+# Joins the filter values of a FacetCombinationCount row; never part of a value
+SEPARATOR = '\x1f'
+SUBTYPE_SEPARATOR = ' — '
+REBUILD_BATCH_SIZE = 5000
+
+# What a card is counted under, and the fields it comes from
+CardKey = namedtuple('CardKey', ['edition_id', 'rarity', 'type', 'color_identity'])
+KEY_FIELDS = {'edition', 'rarity', 'type', 'color_identity'}
+
+
+def card_key(card):
+    return CardKey(*(getattr(card, column) for column in CardKey._fields))
+
+
+def stored_keys(pks):
+    """
+    {pk: CardKey} for the cards as they are in the database
+    """
+    rows = Card.objects.filter(pk__in=pks).values_list('pk', *CardKey._fields)
+    return {pk: CardKey(*key) for pk, *key in rows}
+
+
+def card_type(type_line):
+    """
+    'Creature' for 'Creature — Goblin'
+    """
+    return type_line.split(SUBTYPE_SEPARATOR)[0].strip()
+
+
+def facet_values(key):
+    """
+    (facet, value) pairs a card is counted under in FacetCount
+    """
+    return [('edition', str(key.edition_id)), ('rarity', key.rarity), ('type', key.type)]
+
+
+def browse_values(key):
+    return {
+        'edition': [str(key.edition_id)],
+        'rarity': [key.rarity],
+        'type': [card_type(key.type)],
+        'color': Color.codes(key.color_identity) or [COLORLESS],
+    }
+
+
+def combination_rows(key, combinations=COMBINATIONS):
+    """
+    (combination, facet, filters, value) FacetCombinationCount keys a card is counted under
+    """
+    values = browse_values(key)
+    for combination in combinations:
+        name = '+'.join(combination)
+        for facet in combination:
+            others = [values[other] for other in combination if other != facet]
+            for filters in product(*others):
+                for value in values[facet]:
+                    yield name, facet, SEPARATOR.join(filters), value
+
+
+def add_changes(single, combined, key, delta):
+    for row in facet_values(key):
+        single[row] += delta
+    for row in combination_rows(key):
+        combined[row] += delta
+
+
+def apply(model, key_fields, changes):
+    """
+    Add a Counter of key tuple -> delta to model's stored counts, dropping rows that reach zero
+    """
+    rows = [(*key, delta) for key, delta in changes.items() if delta]
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field) for field in key_fields)
+    placeholders = ', '.join(['%s'] * (len(key_fields) + 1))
+    matches = ' AND '.join(f'{quote(field)} = %s' for field in key_fields)
+    count = quote('count')
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({columns}, {count}) VALUES ({placeholders}) '
+            f'ON CONFLICT ({columns}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+            rows,
+        )
+        emptied = [row[:-1] for row in rows if row[-1] < 0]
+        if emptied:
+            cursor.executemany(f'DELETE FROM {table} WHERE {matches} AND {count} <= 0', emptied)
+
+
+def keys_changed(changes):
+    """
+    Recount cards that moved from old to new keys, given (old, new) pairs;
+    old is None for an added card and new is None for a deleted one
+    """
+    single, combined = Counter(), Counter()
+    for old, new in changes:
+        if old == new:
+            continue
+        if old is not None:
+            add_changes(single, combined, old, -1)
+        if new is not None:
+            add_changes(single, combined, new, 1)
+    if not any(single.values()) and not any(combined.values()):
+        return
+    with transaction.atomic():
+        apply(FacetCount, ['facet', 'value'], single)
+        apply(FacetCombinationCount, ['combination', 'facet', 'filters', 'value'], combined)
+
+
+def card_moved(old, new):
+    keys_changed([(old, new)])
+
+
+def colors_changed(old_keys, masks):
+    """
+    Recount cards whose colors changed: old_keys from stored_keys() before the
+    change, masks the new color identities by pk
+    """
+    keys_changed((key, key._replace(color_identity=masks.get(pk, 0))) for pk, key in old_keys.items())
+
+
+def rebuild():
+    """
+    Recount both tables from the cards table, one combination at a time to bound memory
+    """
+    keys = Counter()
+    rows = Card.objects.order_by().values_list(*CardKey._fields).annotate(cards=Count('pk'))
+    for *key, cards in rows.iterator():
+        keys[CardKey(*key)] += cards
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCombinationCount.objects.all().delete()
+        single = Counter()
+        for key, cards in keys.items():
+            for row in facet_values(key):
+                single[row] += cards
+        FacetCount.objects.bulk_create(
+            (FacetCount(facet=facet, value=value, count=count) for (facet, value), count in single.items()),
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+        for combination in COMBINATIONS:
+            combined = Counter()
+            for key, cards in keys.items():
+                for row in combination_rows(key, [combination]):
+                    combined[row] += cards
+            FacetCombinationCount.objects.bulk_create(
+                (FacetCombinationCount(combination=name, facet=facet, filters=filters, value=value, count=count)
+                 for (name, facet, filters, value), count in combined.items()),
+                batch_size=REBUILD_BATCH_SIZE,
+            )
+    return total()
+
+
+def counts(facet):
+    return dict(FacetCount.objects.filter(facet=facet).values_list('value', 'count'))
+
+
+def total():
+    # Every card has exactly one edition
+    return FacetCount.objects.filter(facet='edition').aggregate(total=Sum('count'))['total'] or 0
+
+
+def count(selected):
+    """
+    Number of cards matching {facet: value} for at most one facet, else None
+    """
+    if not selected:
+        return total()
+    if len(selected) > 1:
+        return None
+    (facet, value), = selected.items()
+    return FacetCount.objects.filter(facet=facet, value=str(value)).values_list('count', flat=True).first() or 0
+
+
+def browse_lookup(facet, selected):
+    """
+    FacetCombinationCount filter for facet's counts under every selected value but its own
+    """
+    others = [other for other in BROWSE_FACETS if other in selected and other != facet]
+    combination = '+'.join(other for other in BROWSE_FACETS if other in others or other == facet)
+    return Q(combination=combination, facet=facet, filters=SEPARATOR.join(selected[other] for other in others))
+
+
+def browse_queryset(selected):
+    lookups = Q(*[browse_lookup(facet, selected) for facet in BROWSE_FACETS], _connector=Q.OR)
+    return FacetCombinationCount.objects.filter(lookups).values_list('facet', 'value', 'count')
+
+
+def browse_result(selected, rows):
+    counts = {facet: {} for facet in BROWSE_FACETS}
+    for facet, value, count in rows:
+        counts[facet][value] = count
+    if selected:
+        # The selected value's count under the other filters is the number of matches
+        facet, value = next(iter(selected.items()))
+        return counts[facet].get(value, 0), counts
+    return sum(counts['edition'].values()), counts
+
+
+def browse_counts(selected):
+    """
+    (total, {facet: {value: count}}) for the cards matching selected
+    {browse facet: value}. Each facet's counts apply every other selected
+    facet, so they show what choosing another value of it would give.
+    """
+    selected = {facet: str(value) for facet, value in selected.items()}
+    return browse_result(selected, browse_queryset(selected))
+
+
+async def abrowse_counts(selected):
+    selected = {facet: str(value) for facet, value in selected.items()}
+    return browse_result(selected, [row async for row in browse_queryset(selected)])
+
+
+def filter_cards(cards, selected):
+    """
+    Narrow a Card queryset to selected {browse facet: value}
+    """
+    if 'edition' in selected:
+        cards = cards.filter(edition_id=selected['edition'])
+    if 'rarity' in selected:
+        cards = cards.filter(rarity=selected['rarity'])
+    if 'type' in selected:
+        value = selected['type']
+        cards = cards.filter(Q(type=value) | Q(type__startswith=value + SUBTYPE_SEPARATOR))
+    if 'color' in selected:
+        if selected['color'] == COLORLESS:
+            cards = cards.with_exact_colors()
+        else:
+            cards = cards.with_colors(selected['color'])
+    return cards
@@ -0,0 +1,136 @@
+"""
+Pre-rendered homepage pool.
+
+A refresher (a daemon thread in the web process, or `manage.py refresh_featured`
+when processes share a cache) samples CARDS_FEATURED_SETS random 9-card sets,
+renders each one's tiles into a single HTML fragment and stores the lot in the
+cache every CARDS_FEATURED_INTERVAL seconds. The index view then serves a
+random set from the pool without touching the database.
+
+Each set records the cards.cache versions of its cards and their editions as
+they were before rendering. Editing or deleting a card bumps its version, so
+every set holding it stops matching; pick() drops such sets from the pool and
+tries another. The pool expires a few intervals after the last refresh, so a
+dead refresher degrades to live sampling rather than a frozen homepage.
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.safestring import mark_safe
+
+from cards import sampler
+from cards.cache import KEY_PREFIX, get_versions, record, render_tiles, run_cache, version_key
+from cards.models import Card
+
+logger = logging.getLogger(__name__)
+
+POOL_KEY = f'{KEY_PREFIX}:featured:pool'
+# Intervals a pool outlives its refresh
+POOL_LIFETIMES = 3
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def set_version_keys(cards):
+    return [version_key('card', card.pk) for card in cards] + [version_key('edition', card.edition_id) for card in cards]
+
+
+def build_set(size=sampler.SAMPLE_SIZE):
+    cards = sampler.sample_cards(size, Card.objects.only('id', 'edition_id', 'sample_slot'))
+    # Versions first: an edit made while rendering then leaves the set already stale
+    versions = get_versions(set_version_keys(cards))
+    return {'cards': [card.pk for card in cards], 'versions': versions, 'html': ''.join(render_tiles(cards))}
+
+
+def refresh(sets=None, interval=None):
+    """
+    Replace the pool with freshly sampled sets and return how many were stored
+    """
+    sets = settings.CARDS_FEATURED_SETS if sets is None else sets
+    interval = settings.CARDS_FEATURED_INTERVAL if interval is None else interval
+    pool = {'generation': uuid.uuid4().hex, 'sets': [build_set() for _ in range(sets)]}
+    cache.set(POOL_KEY, pool, interval * POOL_LIFETIMES)
+    return len(pool['sets'])
+
+
+def is_current(entry):
+    # An evicted version means it changed (see cards.cache), so missing keys count as stale
+    return cache.get_many(list(entry['versions'])) == entry['versions']
+
+
+def drop(generation, stale):
+    pool = cache.get(POOL_KEY)
+    # Leave a pool written by a refresh in the meantime alone
+    if pool is None or pool['generation'] != generation:
+        return
+    pool['sets'] = [entry for entry in pool['sets'] if entry['html'] not in stale]
+    cache.set(POOL_KEY, pool, settings.CARDS_FEATURED_INTERVAL * POOL_LIFETIMES)
+
+
+def pick():
+    """
+    A random current set from the pool, or None if there is none
+    """
+    pool = cache.get(POOL_KEY)
+    if not pool:
+        record('featured', misses=1)
+        return None
+    entries = random.sample(pool['sets'], len(pool['sets']))
+    stale = set()
+    chosen = None
+    for entry in entries:
+        if is_current(entry):
+            chosen = entry
+            break
+        stale.add(entry['html'])
+    if stale:
+        drop(pool['generation'], stale)
+    if chosen is None:
+        record('featured', misses=1)
+        return None
+    record('featured', hits=1)
+    return {'cards': chosen['cards'], 'html': mark_safe(chosen['html'])}
+
+
+async def apick():
+    return await run_cache(pick)
+
+
+def run_refresher(interval, sets=None, iterations=None):
+    """
+    Refresh the pool every interval seconds, forever or for the given number of rounds
+    """
+    done = 0
+    while iterations is None or done < iterations:
+        started = time.monotonic()
+        try:
+            refresh(sets, interval)
+        except Exception:
+            logger.exception('Refreshing the featured pool failed')
+        finally:
+            # This thread's connection outlives any request, so tidy it like one
+            close_old_connections()
+        done += 1
+        if iterations is None or done < iterations:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def ensure_refresher():
+    """
+    Start this process's refresher thread if the settings ask for one
+    """
+    global _refresher
+    if not (settings.CARDS_FEATURED_SETS and settings.CARDS_FEATURED_THREAD):
+        return
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=run_refresher, args=(settings.CARDS_FEATURED_INTERVAL,),
+                                          name='featured-refresher', daemon=True)
+            _refresher.start()
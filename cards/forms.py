@@ -1,9 +1,138 @@
-from django import forms
-
-from cards.models import Card
-
-
-class CardForm(forms.ModelForm):
-    class Meta:
-        model = Card
-        exclude = ['id']
\ No newline at end of file
+import uuid
+
+from django import forms
+from django.conf import settings
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+from cards import choices
+from cards.loading import BATCH_SIZE, CardLoader
+from cards.models import Card, Color, Edition
+from cards.widgets import CachedOptionsSelect, EditionAutocomplete
+
+
+def use_choices(field, provided, empty_label=None, multiple=False):
+    """
+    Point a model choice field at a provider's cached choices and option markup
+    """
+    field.widget = CachedOptionsSelect(options=provided.options, empty_label=empty_label, multiple=multiple)
+    field.widget.is_required = field.required
+    empty = [('', empty_label)] if empty_label is not None else []
+    field.choices = empty + provided.choices
+
+
+class CardForm(forms.ModelForm):
+    class Meta:
+        model = Card
+        exclude = ['id']
+
+    def __init__(self, *args, editions=None, colors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Options come from the cache; validation still checks the querysets
+        edition = self.fields['edition']
+        if settings.CARDS_EDITION_AUTOCOMPLETE:
+            edition.to_field_name = 'code'
+            edition.widget = EditionAutocomplete(reverse('cards:edition-autocomplete'))
+            if self.instance.edition_id:
+                self.initial['edition'] = self.instance.edition.code
+        else:
+            use_choices(edition, choices.EDITIONS.get() if editions is None else editions, edition.empty_label)
+        use_choices(self.fields['colors'], choices.COLORS.get() if colors is None else colors, multiple=True)
+
+    @classmethod
+    async def abuild(cls, *args, **kwargs):
+        """
+        CardForm for async views, with the cached choices looked up asynchronously
+        """
+        editions = None if settings.CARDS_EDITION_AUTOCOMPLETE else await choices.EDITIONS.aget()
+        return cls(*args, editions=editions, colors=await choices.COLORS.aget(), **kwargs)
+
+    async def acreate(self):
+        """
+        Create the card from a valid form, like save() on an unbound instance
+        """
+        fields = {name: value for name, value in self.cleaned_data.items() if name != 'colors'}
+        card = await Card.objects.acreate(**fields)
+        await card.colors.aset(self.cleaned_data['colors'])
+        return card
+
+
+class CardRowForm(CardForm):
+    """
+    One row of a CardBatch. The edition is given by code and the colors as codes
+    ("UR" or ["U", "R"]), both resolved from lookups the batch loads once.
+    """
+    edition = forms.CharField(max_length=3)
+    colors = forms.Field()
+
+    class Meta(CardForm.Meta):
+        exclude = ['id', 'edition', 'colors']
+
+    def __init__(self, *args, editions, color_ids, **kwargs):
+        # Skips CardForm.__init__: there are no choice lists to fill in
+        forms.ModelForm.__init__(self, *args, **kwargs)
+        self.editions = editions
+        self.color_ids = color_ids
+
+    def clean_edition(self):
+        code = self.cleaned_data['edition']
+        if code not in self.editions:
+            raise forms.ValidationError(f'Unknown edition {code!r}')
+        return self.editions[code]
+
+    def clean_colors(self):
+        value = self.cleaned_data['colors']
+        if isinstance(value, str):
+            # "UR", "U,R" or "U R", as in the API's color filter
+            value = [char for char in value if char not in ', ']
+        codes = [str(code).upper() for code in value]
+        unknown = [code for code in codes if code not in self.color_ids]
+        if unknown:
+            raise forms.ValidationError(f'Unknown color {unknown[0]!r}, use any of {"".join(Color.BITS)}')
+        return [self.color_ids[code] for code in dict.fromkeys(codes)]
+
+
+class CardBatch:
+    """
+    Formset-style validation of many new cards. Editions and colors are looked
+    up with one query each for the whole batch, and save() writes it through
+    CardLoader: bulk inserts in a single transaction.
+    """
+    form_class = CardRowForm
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    @cached_property
+    def forms(self):
+        codes = {row.get('edition') for row in self.rows}
+        editions = {edition.code: edition for edition in Edition.objects.filter(code__in=codes - {None})}
+        color_ids = {code: pk for pk, code in Color.objects.values_list('pk', 'code')}
+        return [self.form_class(row, editions=editions, color_ids=color_ids) for row in self.rows]
+
+    def is_valid(self):
+        # Validate every row, not just up to the first bad one
+        return all([form.is_valid() for form in self.forms])
+
+    @property
+    def errors(self):
+        """
+        [{'row': n, 'errors': {field: [...]}}] for the invalid rows, numbered from 1
+        """
+        return [
+            {'row': number, 'errors': {field: [error['message'] for error in errors]
+                                       for field, errors in form.errors.get_json_data().items()}}
+            for number, form in enumerate(self.forms, 1) if form.errors
+        ]
+
+    def save(self, batch_size=BATCH_SIZE):
+        """
+        Create every card of a valid batch and return their ids
+        """
+        objects = []
+        for form in self.forms:
+            fields = dict(form.cleaned_data)
+            fields['edition'] = fields['edition'].pk
+            objects.append({'model': 'cards.card', 'pk': uuid.uuid4(), 'fields': fields})
+        CardLoader(batch_size=batch_size).load(objects)
+        return [obj['pk'] for obj in objects]
@@ -0,0 +1,186 @@
+"""
+Content-addressed store for card images.
+
+`manage.py fetch_images` downloads every card's image_url (http(s) or file://)
+into CARDS_IMAGE_ROOT under the SHA-256 of its bytes and records which digest
+each URL resolved to. Tiles then point at cards:image, which serves the stored
+bytes or a thumbnail CARDS_IMAGE_WIDTHS wide with an ETag and a one-year
+immutable Cache-Control: a name never changes content, so browsers and proxies
+need not revalidate. Cards whose image has not been fetched keep their origin URL.
+
+Layout under the root:
+
+    ab/<digest>.jpg         the original bytes
+    ab/<digest>-250.jpg     a thumbnail 250 pixels wide
+    urls/cd/<url sha256>    the name (<digest>.jpg) the URL resolved to
+
+Thumbnails need Pillow (`pip install Pillow`); without it originals are served.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+FETCH_TIMEOUT = 20
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+USER_AGENT = 'mtgcards-image-fetcher'
+
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+PIL_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'gif': 'GIF', 'webp': 'WEBP'}
+NAME_RE = re.compile(r'(?P<digest>[0-9a-f]{64})(?:-(?P<width>[1-9][0-9]*))?\.(?P<ext>jpg|png|gif|webp)')
+
+
+class ImageError(Exception):
+    pass
+
+
+def sniff(data):
+    """
+    File extension for image bytes, from their magic number
+    """
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    raise ImageError('Not a JPEG, PNG, GIF or WebP image')
+
+
+def thumbnail_name(name, width):
+    stem, ext = name.split('.')
+    return f'{stem}-{width}.{ext}'
+
+
+def write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ImageStore:
+    def __init__(self, root=None):
+        self.root = Path(root or settings.CARDS_IMAGE_ROOT)
+
+    def path(self, name):
+        return self.root / name[:2] / name
+
+    def url_path(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.root / 'urls' / key[:2] / key
+
+    def lookup(self, url):
+        """
+        Name of the image stored for url, or None
+        """
+        try:
+            return self.url_path(url).read_text().strip() or None
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def add(self, data):
+        """
+        Store image bytes (a no-op if they are already stored) and return their name
+        """
+        name = f'{hashlib.sha256(data).hexdigest()}.{sniff(data)}'
+        path = self.path(name)
+        if not path.exists():
+            write_atomic(path, data)
+        return name
+
+    def link(self, url, name):
+        write_atomic(self.url_path(url), name.encode())
+
+    def thumbnail(self, name, width):
+        """
+        Path of name's thumbnail, creating it if needed; None without Pillow or the original
+        """
+        path = self.path(thumbnail_name(name, width))
+        if path.exists():
+            return path
+        original = self.path(name)
+        if Image is None or not original.exists():
+            return None
+        ext = name.rsplit('.', 1)[1]
+        with Image.open(original) as image:
+            # Never upscales, so small originals are copied at their own size
+            image.thumbnail((width, width * 4))
+            output = io.BytesIO()
+            image.save(output, format=PIL_FORMATS[ext])
+        write_atomic(path, output.getvalue())
+        return path
+
+    def resolve(self, name):
+        """
+        File to serve for a cards:image name, or None; only configured widths are generated
+        """
+        match = NAME_RE.fullmatch(name)
+        if not match:
+            return None
+        width = match['width']
+        if width is None:
+            path = self.path(name)
+            return path if path.exists() else None
+        original = f"{match['digest']}.{match['ext']}"
+        if int(width) in settings.CARDS_IMAGE_WIDTHS:
+            return self.thumbnail(original, int(width))
+        path = self.path(name)
+        return path if path.exists() else None
+
+    def image_url(self, url, width=None):
+        """
+        Where a page should load the image for url from: cards:image once it is stored, url until then
+        """
+        name = self.lookup(url)
+        if name is None:
+            return url
+        if width is not None and Image is not None:
+            name = thumbnail_name(name, width)
+        return reverse('cards:image', args=[name])
+
+
+def fetch(url, timeout=FETCH_TIMEOUT, max_bytes=MAX_IMAGE_BYTES):
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    except (OSError, ValueError) as exc:
+        raise ImageError(f'Could not fetch: {exc}') from exc
+    if len(data) > max_bytes:
+        raise ImageError(f'Larger than {max_bytes} bytes')
+    return data
+
+
+def ingest(url, store=None, widths=None):
+    """
+    Fetch url into the store with its thumbnails and return the stored name
+    """
+    store = store or ImageStore()
+    name = store.add(fetch(url))
+    for width in settings.CARDS_IMAGE_WIDTHS if widths is None else widths:
+        store.thumbnail(name, width)
+    # Linked last, so pages only switch over once the thumbnails exist
+    store.link(url, name)
+    return name
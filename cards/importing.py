@@ -0,0 +1,443 @@
+"""
+Parallel imports of third-party card dumps for `manage.py import_cards`.
+
+A dump is NDJSON, CSV or a JSON array of flat card records laid out like
+export_cards output (id, name, mana_cost, ..., edition code, colors), with a
+few common alternative field names accepted. The dumps are cut into shards:
+byte ranges of about SHARD_SIZE for NDJSON, and whole files for CSV and JSON,
+whose records may span lines. A pool of worker processes parses and
+normalizes the shards:
+
+- mana costs become {..} symbols, so '1RR' is stored as '{1}{R}{R}';
+- power and toughness become strings;
+- colors, as codes or names, become a Color.BITS mask;
+- cards with no id, or one that is not a UUID, get a uuid5 id.
+
+Because of the uuid5 ids, importing the same dump again updates the same rows.
+
+This process is the single writer. It resolves edition codes, creating the
+editions it has not seen, writes each shard through CardLoader in a
+transaction of its own, and records the shard in the checkpoint file, so an
+interrupted import resumes with the shards still to do. Facet counts are
+recounted once at the end instead of card by card.
+
+A sync re-imports an edition without rewriting it. Every card and edition
+stores a content hash (cards.models.content_hash). Each shard's rows are
+compared with the stored hashes, one query per batch of rows, and only new
+and changed cards are written. Cards that already exist get color deltas
+rather than new color rows. The cards of the dumps' editions that no row
+mentions are then deleted. Unchanged rows cause no writes and leave their
+cached tiles alone.
+"""
+import csv
+import json
+import os
+import re
+import string
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
+
+import django
+from django.db import connections, router, transaction
+
+from cards import cache, facets, sampler
+from cards.loading import BATCH_SIZE, CardLoader, iter_json_array
+from cards.mana import parse_mana_cost
+from cards.models import Card, Color, Edition, content_hash
+from cards.snapshot import TEXT_COLUMNS, color_objects, edition_objects
+
+SHARD_SIZE = 8 * 1024 * 1024
+FORMATS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv', '.json': 'json'}
+# Errors kept per shard for the report; the rest are only counted
+MAX_ERRORS = 20
+# Namespace of the uuid5 ids given to cards without a UUID of their own
+CARD_NAMESPACE = uuid.UUID('cdbd7e09-2f22-48a3-8dba-83b00753a7e1')
+
+FIELD_ALIASES = {
+    'uuid': 'id', 'manaCost': 'mana_cost', 'type_line': 'type', 'typeLine': 'type', 'oracle_text': 'text',
+    'flavorText': 'flavor', 'flavor_text': 'flavor', 'set': 'edition', 'setCode': 'edition', 'set_code': 'edition',
+    'setName': 'edition_name', 'imageUrl': 'image_url', 'colours': 'colors',
+}
+REQUIRED = ['name', 'type', 'edition']
+MAX_LENGTHS = {field.name: field.max_length for field in Card._meta.concrete_fields
+               if field.name in TEXT_COLUMNS and field.max_length}
+EDITION_CODE_LENGTH = Edition._meta.get_field('code').max_length
+COLOR_NAMES = {name.lower(): code for code, name in Color.COLOR_CHOICES}
+SHORTHAND_RE = re.compile(r'\d+|.')
+COLOR_SPLIT_RE = re.compile(r'[\s,/]+')
+
+
+class Shard(NamedTuple):
+    path: str
+    format: str
+    start: int
+    end: int
+
+    @property
+    def key(self):
+        return f'{self.path}:{self.start}-{self.end}'
+
+
+def normalize_mana_cost(value):
+    """
+    '{1}{R}{R}' for '{1}{R}{R}', '1RR' or '1 R R'; raises ValueError for anything unparseable
+    """
+    value = ''.join(str(value or '').split())
+    if value and '{' not in value:
+        value = ''.join(f'{{{symbol}}}' for symbol in SHORTHAND_RE.findall(value.upper()))
+    parse_mana_cost(value)
+    return value
+
+
+def normalize_stat(value):
+    return '' if value is None else str(value).strip()
+
+
+def color_mask(value):
+    """
+    Color.BITS mask for 'UR', 'U,R', ['U', 'R'] or ['Blue', 'Red']
+    """
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = COLOR_SPLIT_RE.split(value.strip())
+    codes = []
+    for token in value:
+        token = str(token).strip()
+        if not token:
+            continue
+        if token.lower() in COLOR_NAMES:
+            codes.append(COLOR_NAMES[token.lower()])
+        elif all(char in Color.BITS for char in token.upper()):
+            codes.extend(token.upper())
+        else:
+            raise ValueError(f'Unknown color {token!r}')
+    return Color.mask(codes)
+
+
+def card_id(value, edition, name, image_url):
+    if value in (None, ''):
+        return uuid.uuid5(CARD_NAMESPACE, f'{edition}/{name}/{image_url}')
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return uuid.uuid5(CARD_NAMESPACE, str(value))
+
+
+def normalize(record):
+    """
+    (id bytes, edition code, edition name, colors mask, *TEXT_COLUMNS) for one dump record
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object')
+    record = {FIELD_ALIASES.get(key, key): value for key, value in record.items()}
+    missing = [field for field in REQUIRED if not str(record.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f'Missing {", ".join(missing)}')
+
+    fields = {column: str(record.get(column) or '').strip() for column in ('name', 'type', 'set_name', 'image_url')}
+    fields['mana_cost'] = normalize_mana_cost(record.get('mana_cost'))
+    fields['power'] = normalize_stat(record.get('power'))
+    fields['toughness'] = normalize_stat(record.get('toughness'))
+    fields['rarity'] = string.capwords(str(record.get('rarity') or ''))
+    # Blank like load_cards, the fixture and CardForm store them, so an unchanged export syncs as unchanged
+    for column in ('text', 'flavor'):
+        fields[column] = '' if record.get(column) is None else str(record[column])
+    for column, limit in MAX_LENGTHS.items():
+        if len(fields[column]) > limit:
+            raise ValueError(f'{column} is longer than {limit} characters')
+
+    edition = str(record['edition']).strip().upper()
+    if len(edition) > EDITION_CODE_LENGTH:
+        raise ValueError(f'Edition code {edition!r} is longer than {EDITION_CODE_LENGTH} characters')
+    edition_name = str(record.get('edition_name') or '').strip()
+    pk = card_id(record.get('id'), edition, fields['name'], fields['image_url'])
+    return (pk.bytes, edition, edition_name, color_mask(record.get('colors')),
+            *[fields[column] for column in TEXT_COLUMNS])
+
+
+def dump_files(paths):
+    """
+    The dump files among paths, with directories expanded to the dumps inside them
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(child for child in path.iterdir() if child.suffix.lower() in FORMATS))
+        elif path.suffix.lower() in FORMATS:
+            files.append(path)
+        else:
+            raise ValueError(f'{path}: expected a {", ".join(sorted(FORMATS))} file or a directory')
+    return files
+
+
+def plan_shards(files, shard_size=SHARD_SIZE):
+    shards = []
+    for path in files:
+        fmt, size = FORMATS[path.suffix.lower()], path.stat().st_size
+        if fmt != 'ndjson':
+            shards.append(Shard(str(path), fmt, 0, size))
+            continue
+        shards.extend(Shard(str(path), fmt, start, min(start + shard_size, size))
+                      for start in range(0, max(size, 1), shard_size))
+    return shards
+
+
+def read_records(shard):
+    """
+    Yield (location, record) for the records of shard. An NDJSON shard holds the
+    lines that start inside its byte range, as the raw line.
+    """
+    if shard.format == 'ndjson':
+        with open(shard.path, 'rb') as fp:
+            if shard.start:
+                # Skip the line that started in the previous shard
+                fp.seek(shard.start - 1)
+                fp.readline()
+            pos = fp.tell()
+            while pos < shard.end:
+                line = fp.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield f'{shard.path}@{pos}', line
+                pos += len(line)
+    elif shard.format == 'csv':
+        with open(shard.path, encoding='utf-8', newline='') as fp:
+            reader = csv.DictReader(fp)
+            for record in reader:
+                yield f'{shard.path}:{reader.line_num}', record
+    else:
+        with open(shard.path, encoding='utf-8') as fp:
+            for index, record in enumerate(iter_json_array(fp)):
+                yield f'{shard.path}[{index}]', record
+
+
+def parse_shard(shard):
+    """
+    (shard, rows, errors, error count, seconds) with the normalized rows of
+    shard, the last of any repeated id winning
+    """
+    start = time.perf_counter()
+    rows, errors, error_count = {}, [], 0
+    for location, record in read_records(shard):
+        try:
+            row = normalize(json.loads(record) if isinstance(record, bytes) else record)
+        except ValueError as exc:
+            error_count += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append(f'{location}: {exc}')
+            continue
+        rows[row[0]] = row
+    return shard, list(rows.values()), errors, error_count, time.perf_counter() - start
+
+
+def parse_shards(shards, workers):
+    """
+    Yield parse_shard() results as workers finish them, keeping at most two
+    shards per worker parsed ahead of the writer
+    """
+    if workers <= 1:
+        yield from map(parse_shard, shards)
+        return
+
+    # Forked workers must not share this process's connections; they open their own
+    connections.close_all()
+    queue = iter(shards)
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = {executor.submit(parse_shard, shard) for shard in islice(queue, workers * 2)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for job in done:
+                yield job.result()
+                pending.update(executor.submit(parse_shard, shard) for shard in islice(queue, 1))
+
+
+class Checkpoint:
+    """
+    The shards already written, saved to path after each one. A checkpoint
+    only resumes the same dump files, unchanged.
+    """
+    def __init__(self, path, files):
+        self.path = path
+        self.files = {str(file): [file.stat().st_size, file.stat().st_mtime_ns] for file in files}
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as fp:
+                state = json.load(fp)
+            if state['files'] != self.files:
+                raise ValueError(f'The dumps changed since checkpoint {path} was written; delete it to start over')
+            self.done = state['done']
+
+    def save(self, shard, cards):
+        self.done[shard.key] = cards
+        if not self.path:
+            return
+        partial = f'{self.path}.tmp'
+        with open(partial, 'w', encoding='utf-8') as fp:
+            json.dump({'files': self.files, 'done': self.done}, fp)
+        os.replace(partial, self.path)
+
+
+class ShardWriter:
+    """
+    Writes normalized rows through CardLoader, mapping edition and color codes
+    to this database's primary keys.
+
+    With sync, rows whose content hash matches the stored card are left alone,
+    editions given a new name are renamed, and delete_missing() removes the
+    cards of the dumps' editions that no row mentioned.
+    """
+    def __init__(self, batch_size=BATCH_SIZE, sync=False):
+        self.batch_size = batch_size
+        self.sync = sync
+        self.editions = {code: (pk, digest) for code, pk, digest in
+                         Edition.objects.values_list('code', 'pk', 'content_hash')}
+        self.new_colors, self.color_pks = color_objects(dict(Color.COLOR_CHOICES))
+        # Each distinct mask maps to the same pk list; share them between cards
+        self.color_lists = {}
+        # Ids of every row and codes of every edition seen, for delete_missing()
+        self.seen = set()
+        self.synced = set()
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'editions renamed': 0}
+
+    def edition_objects(self, rows):
+        """
+        Fixture objects for the editions of rows missing from this database and,
+        with sync, for the ones whose name changed
+        """
+        names = {}
+        for row in rows:
+            names.setdefault(row[1], row[2])
+        new = {code: name or code for code, name in names.items() if code not in self.editions}
+        objects, pks = edition_objects(list(new.items())) if new else ([], [])
+        for code, pk in zip(new, pks):
+            self.editions[code] = (pk, content_hash([new[code], code]))
+        if self.sync:
+            for code, name in names.items():
+                pk, digest = self.editions[code]
+                if name and code not in new and content_hash([name, code]) != digest:
+                    objects.append({'model': 'cards.edition', 'pk': pk, 'fields': {'name': name, 'code': code}})
+                    self.editions[code] = (pk, content_hash([name, code]))
+                    self.counts['editions renamed'] += 1
+        return objects
+
+    def changed(self, rows):
+        """
+        The rows whose cards are not stored, or are stored with different content
+        """
+        self.seen.update(row[0] for row in rows)
+        self.synced.update(row[1] for row in rows)
+        changed = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            stored = {pk.bytes: digest for pk, digest in Card.objects.filter(
+                pk__in=[uuid.UUID(bytes=row[0]) for row in batch]).values_list('pk', 'content_hash')}
+            for row in batch:
+                pk, code, _, mask, *texts = row
+                digest = stored.get(pk)
+                if digest is None:
+                    self.counts['inserted'] += 1
+                    changed.append(row)
+                elif digest != content_hash([*texts, self.editions[code][0], mask]):
+                    self.counts['updated'] += 1
+                    changed.append(row)
+                else:
+                    self.counts['unchanged'] += 1
+        return changed
+
+    def objects(self, editions, rows):
+        yield from self.new_colors
+        self.new_colors = []
+        yield from editions
+        for pk, code, _, mask, *texts in rows:
+            if mask not in self.color_lists:
+                self.color_lists[mask] = [pk for bit, pk in self.color_pks.items() if mask & bit]
+            fields = dict(zip(TEXT_COLUMNS, texts))
+            fields['edition'] = self.editions[code][0]
+            fields['colors'] = self.color_lists[mask]
+            yield {'model': 'cards.card', 'pk': uuid.UUID(bytes=pk), 'fields': fields}
+
+    def write(self, rows):
+        # Before changed(), which hashes rows with their editions' pks
+        editions = self.edition_objects(rows)
+        if self.sync:
+            rows = self.changed(rows)
+        if not (rows or editions or self.new_colors):
+            return 0
+        # A sync touches few cards, which are cheaper to move between facet counts than to recount
+        loader = CardLoader(batch_size=self.batch_size, upsert=True, defer_facets=not self.sync)
+        return loader.load(self.objects(editions, rows))['cards']
+
+    def delete_missing(self):
+        """
+        Delete the cards of the synced editions whose ids no row had. The rows
+        go in raw batched DELETEs, with no per-card signals; their sample
+        slots, facet counts and cached tiles are then fixed up in bulk.
+        """
+        editions = [self.editions[code][0] for code in self.synced]
+        stored = Card.objects.filter(edition_id__in=editions).values_list('pk', 'sample_slot', *facets.CardKey._fields)
+        missing = {pk: (slot, facets.CardKey(*key)) for pk, slot, *key in stored.iterator(chunk_size=self.batch_size)
+                   if pk.bytes not in self.seen}
+        self.counts['deleted'] = len(missing)
+        if not missing:
+            return
+        pks = list(missing)
+        using = router.db_for_write(Card)
+        with transaction.atomic(using=using):
+            for start in range(0, len(pks), self.batch_size):
+                batch = pks[start:start + self.batch_size]
+                # A raw delete skips the cascade to the card colors
+                Card.colors.through.objects.using(using).filter(card_id__in=batch)._raw_delete(using)
+                Card.objects.using(using).filter(pk__in=batch)._raw_delete(using)
+            sampler.release_slots(slot for slot, _ in missing.values())
+            facets.keys_changed((key, None) for _, key in missing.values())
+        for start in range(0, len(pks), self.batch_size):
+            cache.invalidate_cards(pks[start:start + self.batch_size])
+
+
+def import_dumps(paths, workers=4, batch_size=BATCH_SIZE, shard_size=SHARD_SIZE, checkpoint=None, progress=None,
+                 sync=False):
+    """
+    Import the dump files or directories in paths and return counts of the
+    shards, cards and skipped rows, with the first errors of each shard.
+    progress(counts) is called after every shard written.
+
+    sync only writes the cards that are new or changed, and deletes the cards
+    of the dumps' editions that the dumps no longer have, unless some rows
+    were invalid: their cards may be among the missing ones.
+    """
+    if sync and checkpoint:
+        raise ValueError('A sync compares every shard, so it cannot resume from a checkpoint')
+    files = dump_files(paths)
+    shards = plan_shards(files, shard_size)
+    state = Checkpoint(checkpoint, files)
+    todo = [shard for shard in shards if shard.key not in state.done]
+    counts = {
+        'shards': len(shards), 'resumed': len(shards) - len(todo), 'written': 0,
+        'cards': sum(state.done.values()), 'parsed': 0, 'skipped': 0, 'parse seconds': 0.0,
+    }
+    errors = []
+    writer = ShardWriter(batch_size, sync=sync)
+    for shard, rows, shard_errors, error_count, seconds in parse_shards(todo, workers):
+        cards = writer.write(rows)
+        state.save(shard, cards)
+        counts['written'] += 1
+        counts['cards'] += cards
+        counts['parsed'] += len(rows) + error_count
+        counts['skipped'] += error_count
+        counts['parse seconds'] += seconds
+        errors.extend(shard_errors)
+        if progress:
+            progress(counts)
+    if not sync:
+        facets.rebuild()
+    elif not counts['skipped']:
+        writer.delete_missing()
+    if sync:
+        counts.update(writer.counts)
+    return counts, errors
@@ -0,0 +1,193 @@
+"""
+Per-request performance instrumentation.
+
+Every database connection gets an execute wrapper (see install) and templates
+are timed by the TimedDjangoTemplates backend, set in TEMPLATES. Both add to
+the RequestMetrics of the request being served, found through a context
+variable so that async views' queries, run in worker threads on other
+connections, are counted too. PerformanceMiddleware then reports query count,
+SQL time, repeated queries, template time and response size:
+
+* as a Server-Timing header, readable in the browser's network panel, when
+  CARDS_SERVER_TIMING is on (by default only with DEBUG: it tells any client
+  how long the server spent)
+* as a JSON line on the 'cards.perf' logger, for a CARDS_PERF_SAMPLE_RATE
+  share of requests; `manage.py perfstats` summarizes those lines per URL name
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('cards.perf')
+
+# Metrics of the request being served in this thread or task
+current_metrics = ContextVar('current_metrics', default=None)
+# How many repeated statements a log line lists
+REPEATED_SHOWN = 3
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.rendering = False
+
+    def add_query(self, sql, params, elapsed):
+        self.sql_time += elapsed
+        self.queries += 1
+        self.statements[sql, repr(params)] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Queries that repeated an earlier statement with the same parameters
+        """
+        return sum(count - 1 for count in self.statements.values())
+
+    def by_sql(self):
+        counts = Counter()
+        for (sql, params), count in self.statements.items():
+            counts[sql] += count
+        return counts
+
+    @property
+    def similar(self):
+        """
+        Queries that repeated an earlier statement with other parameters, the N+1 pattern
+        """
+        return sum(count - 1 for count in self.by_sql().values()) - self.duplicates
+
+    def repeated(self):
+        return [{'sql': sql[:200], 'count': count}
+                for sql, count in self.by_sql().most_common(REPEATED_SHOWN) if count > 1]
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries ({self.duplicates} duplicate)"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'total;dur={self.duration * 1000:.2f}',
+        ])
+
+    def as_dict(self, request, response):
+        match = request.resolver_match
+        return {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(self.duration * 1000, 3),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'duplicate_queries': self.duplicates,
+            'similar_queries': self.similar,
+            'repeated': self.repeated(),
+            'template_ms': round(self.template_time * 1000, 3),
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, params, time.perf_counter() - start)
+
+
+def install(connection):
+    """
+    Add record_query to a connection's execute wrappers, once
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        # A template rendered from inside another is already being timed
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, adding the time spent rendering to the current request's metrics
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted values
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @contextmanager
+    def measure(self):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        # New connections are covered by cards.signals; these may predate it
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        try:
+            yield metrics
+        finally:
+            current_metrics.reset(token)
+            metrics.duration = time.perf_counter() - metrics.started
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure() as metrics:
+            response = self.get_response(request)
+        return self.report(request, response, metrics)
+
+    async def __acall__(self, request):
+        with self.measure() as metrics:
+            response = await self.get_response(request)
+        return self.report(request, response, metrics)
+
+    def report(self, request, response, metrics):
+        if settings.CARDS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        if random.random() < settings.CARDS_PERF_SAMPLE_RATE:
+            logger.info(json.dumps(metrics.as_dict(request, response)))
+        return response
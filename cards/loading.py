@@ -0,0 +1,223 @@
+"""
+Streaming, batched loading of card fixtures such as data/full_fixture.json.
+
+iter_json_array() yields one fixture object at a time from the file, so memory
+stays bounded by the batch size rather than the size of the dump. CardLoader
+writes those objects with bulk_create, bypassing the per-object saves (and
+signals) of loaddata, and fills in the denormalized Card columns itself.
+"""
+import json
+
+from django.db import transaction
+
+from cards import cache, facets, sampler
+from cards.models import Card, Color, Edition
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+# Past this many cards in one load, recounting the facets once at the end
+# beats moving every card between counts
+FACET_RECOUNT_THRESHOLD = 20000
+SKIP_CHARS = ' \t\r\n,'
+
+# Stands in for the stored facet key of a card that is not stored yet
+NO_COLORS = facets.CardKey(None, None, None, 0)
+
+# Columns the signals maintain for saved cards; the loader derives them itself
+SIGNAL_FIELDS = {'sample_slot', 'color_identity'}
+
+
+def iter_json_array(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield the items of the top-level JSON array in the text file fp, reading it
+    chunk_size characters at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    opened = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in SKIP_CHARS:
+            pos += 1
+        if pos == len(buffer):
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                raise ValueError('Unexpected end of input inside the JSON array')
+            buffer, pos = chunk, 0
+            continue
+
+        if not opened:
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array of fixture objects')
+            opened = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # A value running to the end of the buffer may have been cut short
+            complete = end < len(buffer)
+        except json.JSONDecodeError:
+            complete = False
+        if not complete:
+            chunk = fp.read(chunk_size)
+            if chunk:
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            # Nothing more to read: let a genuinely broken item raise
+            item, end = decoder.raw_decode(buffer, pos)
+        yield item
+        pos = end
+
+
+class CardLoader:
+    """
+    Batches fixture objects into bulk_create calls. Use inside one transaction,
+    via load(), so a failed load leaves nothing behind.
+    """
+    def __init__(self, batch_size=BATCH_SIZE, upsert=False, defer_facets=False):
+        self.batch_size = batch_size
+        self.upsert = upsert
+        # Leave the facet counts to the caller, who recounts them with facets.rebuild()
+        self.defer_facets = defer_facets
+        self.pending = {Color: [], Edition: [], Card: []}
+        self.card_colors = []
+        self.counts = {'colors': 0, 'editions': 0, 'cards': 0, 'card colors': 0}
+        self.color_codes = dict(Color.objects.values_list('pk', 'code'))
+        # Next free sample slot, while load() runs
+        self.next_slot = None
+        # (old, new) facet keys of the cards written by load() so far, or None to recount
+        self.facet_changes = []
+        self.card_fields = {
+            field.name: field.attname for field in Card._meta.concrete_fields
+            if not field.primary_key and field.name not in SIGNAL_FIELDS
+        }
+
+    def load(self, objects):
+        with transaction.atomic():
+            self.next_slot = sampler.slot_count()
+            for obj in objects:
+                self.add(obj)
+            self.flush()
+            # A no-op unless add() was used outside load()
+            sampler.fill_missing_slots()
+            if self.defer_facets:
+                return self.counts
+            if self.facet_changes is None:
+                facets.rebuild()
+            else:
+                facets.keys_changed(self.facet_changes)
+        return self.counts
+
+    def add(self, obj):
+        model, pk, fields = obj['model'], obj['pk'], obj['fields']
+        if model == 'cards.color':
+            self.color_codes[pk] = fields['code']
+            self.pending[Color].append(Color(pk=pk, name=fields['name'], code=fields['code']))
+        elif model == 'cards.edition':
+            edition = Edition(pk=pk, name=fields['name'], code=fields['code'])
+            edition.content_hash = edition.compute_content_hash()
+            self.pending[Edition].append(edition)
+        elif model == 'cards.card':
+            self.add_card(pk, fields)
+        else:
+            raise ValueError(f'Unexpected model {model!r} in card fixture')
+
+        if any(len(batch) >= self.batch_size for batch in self.pending.values()):
+            self.flush()
+
+    def add_card(self, pk, fields):
+        card = Card(pk=pk, **{attname: fields[name] for name, attname in self.card_fields.items() if name in fields})
+        colors = fields.get('colors', [])
+        card.color_identity = Color.mask(self.color_codes[color_id] for color_id in colors)
+        card.refresh_derived_fields()
+        card.content_hash = card.compute_content_hash()
+        self.pending[Card].append(card)
+        self.card_colors.extend(Card.colors.through(card_id=card.pk, color_id=color_id) for color_id in colors)
+
+    def flush(self):
+        # Parents first, for backends that check foreign keys immediately
+        self.write(Color, 'colors', ['name', 'code'])
+        self.write(Edition, 'editions', ['name', 'code', 'content_hash'])
+        cards = self.pending[Card]
+        # Upserted cards that already exist, with the facet values they are counted under
+        stored = facets.stored_keys([card.pk for card in cards]) if self.upsert and cards else {}
+        self.assign_slots(cards, stored)
+        self.write(Card, 'cards', list(self.card_fields) + ['color_identity'])
+        self.count_facets(cards, stored)
+        self.write_colors(cards, stored)
+
+    def write_colors(self, cards, stored):
+        """
+        Insert the pending card colors. Cards that already exist only gain the
+        colors their stored color_identity lacks, and lose the ones it has
+        that they no longer do, with one DELETE per color.
+        """
+        through = Card.colors.through.objects
+        added = self.card_colors
+        if stored:
+            to_uuid = Card._meta.pk.to_python
+            bits = {pk: Color.BITS[code] for pk, code in self.color_codes.items()}
+            added = [row for row in added if not stored.get(to_uuid(row.card_id), NO_COLORS).color_identity
+                     & bits[row.color_id]]
+            removed = {}
+            for card in cards:
+                old = stored.get(to_uuid(card.pk), NO_COLORS).color_identity & ~card.color_identity
+                for color_id, bit in bits.items():
+                    if old & bit:
+                        removed.setdefault(color_id, []).append(card.pk)
+            for color_id, card_ids in removed.items():
+                through.filter(color_id=color_id, card_id__in=card_ids).delete()
+        through.bulk_create(added, batch_size=self.batch_size, ignore_conflicts=bool(stored))
+        self.counts['card colors'] += len(added)
+        self.card_colors = []
+
+    def assign_slots(self, cards, existing):
+        """
+        Number new cards on from the end of the sample range as they are inserted,
+        which is far cheaper than a bulk_update afterwards. Upserted cards that
+        already exist keep their slot: sample_slot is not among the updated fields.
+        """
+        if not cards or self.next_slot is None:
+            return
+        to_uuid = Card._meta.pk.to_python
+        for card in cards:
+            if to_uuid(card.pk) not in existing:
+                card.sample_slot = self.next_slot
+                self.next_slot += 1
+
+    def count_facets(self, cards, stored):
+        if self.defer_facets:
+            return
+        to_uuid = Card._meta.pk.to_python
+        changes = [(stored.get(to_uuid(card.pk)), facets.card_key(card)) for card in cards]
+        if self.next_slot is None:
+            # add() outside load(): nothing will apply them later
+            facets.keys_changed(changes)
+        elif self.facet_changes is not None:
+            self.facet_changes.extend(changes)
+            if len(self.facet_changes) > FACET_RECOUNT_THRESHOLD:
+                self.facet_changes = None
+
+    def write(self, model, label, update_fields):
+        batch = self.pending[model]
+        if not batch:
+            return
+        options = {}
+        if self.upsert:
+            options = {'update_conflicts': True, 'unique_fields': ['pk'], 'update_fields': update_fields}
+        model.objects.bulk_create(batch, batch_size=self.batch_size, **options)
+        self.counts[label] += len(batch)
+        self.pending[model] = []
+        # bulk_create sends no signals, so invalidate cached tiles and choice lists here
+        self.invalidate(model, [obj.pk for obj in batch])
+
+    def invalidate(self, model, pks):
+        if model is Card:
+            cache.invalidate_cards(pks)
+        elif model is Edition:
+            cache.invalidate_editions(pks)
+        else:
+            cache.invalidate_colors()
@@ -0,0 +1,90 @@
+"""
+Mana cost parsing, e.g. '{2}{W/U}{R/P}' -> mana value 4 with one W, U and R pip.
+
+Symbols follow the comprehensive rules for mana value:
+    {3}      generic, counts its number
+    {X}      X, Y and Z count as 0
+    {W}      colored, counts 1
+    {W/U}    hybrid, counts 1
+    {2/W}    monocolored hybrid, counts 2
+    {W/P}    Phyrexian, counts 1
+    {C} {S}  colorless and snow, count 1
+
+Pips are counted the way devotion counts them: a hybrid symbol is a pip of
+each of its colors, and Phyrexian symbols are pips of their color.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+
+COLORS = 'WUBRG'
+PIP_FIELDS = {code: f'pips_{code.lower()}' for code in COLORS}
+VARIABLE = {'X', 'Y', 'Z'}
+ONE_MANA = {'C', 'S'}
+
+COST_RE = re.compile(r'(?:\{[^{}]+\})*')
+SYMBOL_RE = re.compile(r'\{([^{}]+)\}')
+
+
+class ManaCost(NamedTuple):
+    value: int
+    # Pip counts in COLORS (WUBRG) order
+    pips: tuple
+    variable: bool
+
+    def pip_counts(self):
+        return dict(zip(COLORS, self.pips))
+
+
+def parse_symbol(symbol):
+    """
+    (mana value, colors) for the inside of one {...} symbol
+    """
+    symbol = symbol.upper()
+    if symbol.isdigit():
+        return int(symbol), ''
+    if symbol in VARIABLE:
+        return 0, ''
+    if symbol in ONE_MANA:
+        return 1, ''
+    if symbol in COLORS:
+        return 1, symbol
+
+    parts = symbol.split('/')
+    colors = ''.join(part for part in parts if part in COLORS)
+    if len(parts) > 1 and colors and all(part in COLORS or part == 'P' or part.isdigit() for part in parts):
+        # {2/W} costs 2 if paid with generic mana; {W/U}, {W/P} and {G/U/P} cost 1
+        return max([int(part) for part in parts if part.isdigit()] + [1]), colors
+    raise ValueError(f'Unknown mana symbol {{{symbol}}}')
+
+
+@lru_cache(maxsize=4096)
+def parse_mana_cost(cost):
+    """
+    Parse a cost such as '{1}{R}{R}'. Empty or None costs are worth 0.
+    Raises ValueError for anything that is not a run of {...} symbols.
+    """
+    if not cost:
+        return ManaCost(0, (0,) * len(COLORS), False)
+    if not COST_RE.fullmatch(cost):
+        raise ValueError(f'Malformed mana cost {cost!r}')
+
+    pips = dict.fromkeys(COLORS, 0)
+    value = 0
+    variable = False
+    for symbol in SYMBOL_RE.findall(cost):
+        symbol_value, colors = parse_symbol(symbol)
+        value += symbol_value
+        variable = variable or symbol.upper() in VARIABLE
+        for color in colors:
+            pips[color] += 1
+    return ManaCost(value, tuple(pips.values()), variable)
+
+
+def validate_mana_cost(cost):
+    try:
+        parse_mana_cost(cost)
+    except ValueError as error:
+        raise ValidationError(str(error))
@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import export
+from cards.models import Card, Edition
+
+
+class Command(BaseCommand):
+    help = ('Stream the card catalogue to NDJSON, CSV or a columnar snapshot that load_cards reads back, '
+            'optionally as one file per edition')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='file to write, or a directory with --by-edition')
+        parser.add_argument('--format', choices=sorted(export.WRITERS), default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+                            help='rows read from the database at a time')
+        parser.add_argument('--by-edition', action='store_true', help='write one <code>.<ext> file per edition')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='worker processes exporting editions with --by-edition')
+        parser.add_argument('--edition', action='append', dest='editions', metavar='CODE',
+                            help='only export these editions (repeatable)')
+
+    def handle(self, *args, **options):
+        editions = None
+        if options['editions']:
+            editions = list(Edition.objects.filter(code__in=options['editions']).order_by('code'))
+            unknown = set(options['editions']) - {edition.code for edition in editions}
+            if unknown:
+                raise CommandError(f'Unknown edition codes: {", ".join(sorted(unknown))}')
+
+        start = time.perf_counter()
+        if options['by_edition']:
+            counts = export.export_shards(options['output'], options['format'], editions,
+                                          options['chunk_size'], options['workers'])
+            count, files = sum(counts.values()), len(counts)
+        else:
+            queryset = None
+            if editions is not None:
+                queryset = Card.objects.filter(edition__in=editions).order_by('name', 'id')
+            count, files = export.export(options['output'], options['format'], queryset, editions,
+                                         options['chunk_size']), 1
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {count} cards to {files} {options["format"]} file{"s" if files != 1 else ""} '
+            f'in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} cards/s)'
+        ))
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from cards import cache
+from cards.images import ImageError, ImageStore, ingest
+from cards.models import Card
+
+# Stay under SQLite's bound-parameter limit
+INVALIDATE_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = ('Fetch card images (http(s) or file:// URLs) into the content-addressed image store '
+            'with their thumbnails, and point the card tiles at them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='concurrent downloads')
+        parser.add_argument('--limit', type=int, help='fetch at most this many URLs')
+        parser.add_argument('--refetch', action='store_true', help='fetch URLs that are already stored again')
+
+    def fetch(self, url):
+        try:
+            return url, ingest(url, self.store), None
+        except (ImageError, OSError) as exc:
+            return url, None, exc
+
+    def handle(self, *args, **options):
+        self.store = ImageStore()
+        urls = Card.objects.exclude(image_url='').order_by('image_url').values_list('image_url', flat=True).distinct()
+        urls = [url for url in urls if options['refetch'] or self.store.lookup(url) is None]
+        if options['limit'] is not None:
+            urls = urls[:options['limit']]
+
+        start = time.perf_counter()
+        fetched, failed = [], 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for url, name, error in executor.map(self.fetch, urls):
+                if error is None:
+                    fetched.append(url)
+                else:
+                    failed += 1
+                    self.stderr.write(f'{url}: {error}')
+        # Tiles rendered with the origin URL are cached; bump their cards so they re-render
+        for i in range(0, len(fetched), INVALIDATE_BATCH):
+            cache.invalidate_cards(Card.objects.filter(image_url__in=fetched[i:i + INVALIDATE_BATCH])
+                                   .values_list('pk', flat=True))
+        elapsed = time.perf_counter() - start
+
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'Fetched {len(fetched)} images ({failed} failed) in {elapsed:.2f}s'))
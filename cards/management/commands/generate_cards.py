@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.loading import BATCH_SIZE, CardLoader
+from cards.synthetic import SyntheticCatalogue
+
+
+class Command(BaseCommand):
+    help = 'Add a synthetic catalogue modelled on a card fixture, for benchmarking at 10k to millions of cards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=10_000, help='number of cards to add')
+        parser.add_argument('--editions', type=int, help='number of editions to add (default: one per 375 cards)')
+        parser.add_argument('--seed', type=int, help='make the catalogue reproducible')
+        parser.add_argument('--fixture', default=settings.BASE_DIR / 'data' / 'full_fixture.json',
+                            help='fixture whose distributions to follow')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['cards'] < 1:
+            raise CommandError('--cards must be positive')
+        try:
+            with open(options['fixture'], encoding='utf-8') as fp:
+                catalogue = SyntheticCatalogue(json.load(fp), seed=options['seed'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+
+        start = time.perf_counter()
+        objects = catalogue.objects(options['cards'], options['editions'])
+        counts = CardLoader(batch_size=options['batch_size']).load(objects)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['cards']} cards in {counts['editions']} editions in {elapsed:.2f}s "
+            f"({counts['cards'] / max(elapsed, 1e-9):,.0f} cards/s)"
+        ))
@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import importing
+from cards.loading import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Import third-party NDJSON, CSV or JSON card dumps, parsing shards in parallel worker processes and '
+            'writing them from this one, with a checkpoint to resume from')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dumps', nargs='+', help='dump files, or directories of them')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='worker processes parsing shards')
+        parser.add_argument('--shard-size', type=int, default=importing.SHARD_SIZE,
+                            help='bytes of NDJSON per shard; CSV and JSON files are one shard each')
+        parser.add_argument('--checkpoint', help='file recording the shards written; an import given the same '
+                                                 'file again skips them')
+        parser.add_argument('--sync', action='store_true',
+                            help="only write new and changed cards, and delete the cards of the dumps' editions "
+                                 "that the dumps no longer have")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['shard_size'] < 1:
+            raise CommandError('--shard-size must be positive')
+        start = time.perf_counter()
+
+        def progress(counts):
+            elapsed = time.perf_counter() - start
+            done = counts['resumed'] + counts['written']
+            self.stdout.write(f"{done}/{counts['shards']} shards, {counts['cards']} cards "
+                              f"({counts['cards'] / max(elapsed, 1e-9):,.0f} cards/s)")
+
+        try:
+            counts, errors = importing.import_dumps(
+                options['dumps'], workers=options['workers'], batch_size=options['batch_size'],
+                shard_size=options['shard_size'], checkpoint=options['checkpoint'], progress=progress,
+                sync=options['sync'],
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - start
+
+        for error in errors:
+            self.stderr.write(self.style.WARNING(error))
+        if counts['resumed']:
+            self.stdout.write(f"Skipped {counts['resumed']} shards already written according to the checkpoint")
+        if options['sync']:
+            if counts['skipped']:
+                self.stdout.write('Not deleting missing cards: some rows were invalid')
+            self.stdout.write(f"Synced: {counts['inserted']} inserted, {counts['updated']} updated, "
+                              f"{counts['unchanged']} unchanged, {counts['deleted']} deleted, "
+                              f"{counts['editions renamed']} editions renamed")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['cards']} cards from {counts['shards']} shards in {elapsed:.2f}s "
+            f"({counts['cards'] / max(elapsed, 1e-9):,.0f} cards/s, parsing "
+            f"{counts['parsed'] / max(counts['parse seconds'], 1e-9):,.0f} rows/s per worker), "
+            f"skipped {counts['skipped']} invalid rows"
+        ))
@@ -0,0 +1,38 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from cards.loading import BATCH_SIZE, CardLoader, iter_json_array
+from cards.snapshot import is_snapshot, iter_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Stream a card fixture such as data/full_fixture.json, or an export_cards snapshot, into the database '
+            'using bulk inserts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='JSON fixture of colors, editions and cards, or a card snapshot')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--upsert', action='store_true',
+                            help='Update rows whose primary key already exists instead of failing')
+
+    def handle(self, *args, **options):
+        loader = CardLoader(batch_size=options['batch_size'], upsert=options['upsert'])
+        start = time.perf_counter()
+        try:
+            with open(options['fixture'], 'rb') as fp:
+                if is_snapshot(fp):
+                    counts = loader.load(iter_snapshot(fp))
+                else:
+                    counts = loader.load(iter_json_array(io.TextIOWrapper(fp, encoding='utf-8')))
+        except IntegrityError as exc:
+            raise CommandError(f'{exc} (pass --upsert to update rows that already exist)')
+        elapsed = time.perf_counter() - start
+
+        rows = sum(counts.values())
+        summary = ', '.join(f'{count} {label}' for label, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {summary} in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)'
+        ))
@@ -0,0 +1,64 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.instrumentation import percentile
+
+
+class Command(BaseCommand):
+    help = 'Summarize the sampled request timings logged to cards.perf: p50/p95/p99 per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='*', help='log files to read (default: MTGCARDS_PERF_LOG)')
+        parser.add_argument('--view', help='only URL names starting with this, e.g. cards: or admin:')
+
+    def handle(self, *args, **options):
+        paths = options['logs'] or ([settings.CARDS_PERF_LOG] if settings.CARDS_PERF_LOG else [])
+        if not paths:
+            raise CommandError('No log files given and MTGCARDS_PERF_LOG is not set')
+
+        samples = defaultdict(list)
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as fp:
+                    for line in fp:
+                        # Tolerate a formatter that prefixes the JSON with a timestamp or level
+                        start = line.find('{')
+                        if start < 0:
+                            continue
+                        try:
+                            sample = json.loads(line[start:])
+                        except ValueError:
+                            continue
+                        view = sample.get('view') or '(unresolved)'
+                        if not options['view'] or view.startswith(options['view']):
+                            samples[view].append(sample)
+            except OSError as exc:
+                raise CommandError(exc)
+
+        if not samples:
+            self.stdout.write('No samples')
+            return
+
+        rows = []
+        for view, group in samples.items():
+            count = len(group)
+            durations = sorted(sample['duration_ms'] for sample in group)
+            sizes = [sample['response_bytes'] for sample in group if sample.get('response_bytes') is not None]
+            rows.append((
+                view, count, percentile(durations, 0.5), percentile(durations, 0.95), percentile(durations, 0.99),
+                sum(sample['queries'] for sample in group) / count,
+                sum(sample['sql_ms'] for sample in group) / count,
+                sum(sample['template_ms'] for sample in group) / count,
+                sum(sample['duplicate_queries'] for sample in group) / count,
+                sum(sizes) / len(sizes) / 1024 if sizes else 0,
+            ))
+
+        self.stdout.write(f"{'view':<40} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                          f"{'queries':>8} {'sql ms':>8} {'tpl ms':>8} {'dupes':>6} {'KB':>8}")
+        # Slowest tail first
+        for view, count, p50, p95, p99, queries, sql, template, dupes, size in sorted(rows, key=lambda row: -row[3]):
+            self.stdout.write(f'{view[:40]:<40} {count:>6} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} '
+                              f'{queries:>8.1f} {sql:>8.2f} {template:>8.2f} {dupes:>6.1f} {size:>8.1f}')
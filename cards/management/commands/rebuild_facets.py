@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cards import facets
+
+
+class Command(BaseCommand):
+    help = 'Recount the admin filter and browse page card counts, e.g. after raw SQL edits'
+
+    def handle(self, *args, **options):
+        total = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Counted facets for {total} cards'))
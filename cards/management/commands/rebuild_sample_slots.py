@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cards import sampler
+
+
+class Command(BaseCommand):
+    help = 'Renumber Card.sample_slot densely, e.g. after bulk inserts or raw SQL deletes'
+
+    def handle(self, *args, **options):
+        count = sampler.rebuild_slots()
+        self.stdout.write(self.style.SUCCESS(f'Assigned {count} sample slots'))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cards import similar
+
+
+class Command(BaseCommand):
+    help = 'Build the similar-card index from every card, or with --extend bring the current one up to date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--extend', action='store_true',
+                            help='only vectorize new and changed cards, rebuilding if there are too many')
+
+    def handle(self, *args, **options):
+        if similar.np is None:
+            raise CommandError('The similar-card index needs NumPy: pip install numpy')
+        start = time.perf_counter()
+        if options['extend']:
+            stats = similar.extend()
+        else:
+            stats = similar.build()
+        elapsed = time.perf_counter() - start
+
+        if options['extend'] and not stats['rebuilt']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Extended the index to {stats['cards']} cards in {elapsed:.2f}s: {stats['added']} vectorized, "
+                f"{stats['tail']} in the tail, {stats['dropped']} rows dropped"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Indexed {stats['cards']} cards in {stats['clusters']} clusters in {elapsed:.2f}s"
+            ))
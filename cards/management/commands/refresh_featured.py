@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cards import featured
+
+
+class Command(BaseCommand):
+    help = 'Keep the pre-rendered homepage pool filled; needs a cache shared with the web processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sets', type=int, default=settings.CARDS_FEATURED_SETS or 20,
+                            help='random 9-card sets to keep in the pool')
+        parser.add_argument('--interval', type=int, default=settings.CARDS_FEATURED_INTERVAL,
+                            help='seconds between refreshes')
+        parser.add_argument('--once', action='store_true', help='refresh once and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = featured.refresh(options['sets'], options['interval'])
+            self.stdout.write(self.style.SUCCESS(f'Stored {count} featured sets'))
+            return
+        self.stdout.write(f"Refreshing {options['sets']} featured sets every {options['interval']}s")
+        featured.run_refresher(options['interval'], options['sets'])
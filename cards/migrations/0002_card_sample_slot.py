@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:30
+
+from django.db import migrations, models
+
+
+def assign_sample_slots(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    cards = Card.objects.using(schema_editor.connection.alias)
+    batch = []
+    pks = cards.order_by('pk').values_list('pk', flat=True)
+    for slot, pk in enumerate(pks.iterator(chunk_size=2000)):
+        batch.append(Card(pk=pk, sample_slot=slot))
+        if len(batch) >= 2000:
+            cards.bulk_update(batch, ['sample_slot'])
+            batch = []
+    if batch:
+        cards.bulk_update(batch, ['sample_slot'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='sample_slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(assign_sample_slots, migrations.RunPython.noop),
+    ]
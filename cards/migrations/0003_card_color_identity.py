@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:32
+
+from django.db import migrations, models
+
+# Color.BITS at the time of this migration
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+
+
+def backfill_color_identity(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    db_alias = schema_editor.connection.alias
+    masks = {}
+    rows = Card.colors.through.objects.using(db_alias).values_list('card_id', 'color__code')
+    for card_id, code in rows.iterator(chunk_size=2000):
+        masks[card_id] = masks.get(card_id, 0) | COLOR_BITS.get(code, 0)
+
+    by_mask = {}
+    for card_id, mask in masks.items():
+        by_mask.setdefault(mask, []).append(card_id)
+    for mask, card_ids in by_mask.items():
+        for start in range(0, len(card_ids), 500):
+            Card.objects.using(db_alias).filter(pk__in=card_ids[start:start + 500]).update(color_identity=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0002_card_sample_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='color_identity',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_color_identity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:33
+
+from django.db import migrations
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE cards_card_fts USING fts5(
+        name, type, text, flavor,
+        content='cards_card', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """
+    CREATE TRIGGER cards_card_fts_ai AFTER INSERT ON cards_card BEGIN
+        INSERT INTO cards_card_fts(rowid, name, type, text, flavor)
+        VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+    END""",
+    """
+    CREATE TRIGGER cards_card_fts_ad AFTER DELETE ON cards_card BEGIN
+        INSERT INTO cards_card_fts(cards_card_fts, rowid, name, type, text, flavor)
+        VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+    END""",
+    """
+    CREATE TRIGGER cards_card_fts_au AFTER UPDATE ON cards_card BEGIN
+        INSERT INTO cards_card_fts(cards_card_fts, rowid, name, type, text, flavor)
+        VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+        INSERT INTO cards_card_fts(rowid, name, type, text, flavor)
+        VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+    END""",
+    "INSERT INTO cards_card_fts(cards_card_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS cards_card_fts_ai',
+    'DROP TRIGGER IF EXISTS cards_card_fts_ad',
+    'DROP TRIGGER IF EXISTS cards_card_fts_au',
+    'DROP TABLE IF EXISTS cards_card_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite only; cards.search falls back to LIKE on other backends
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0003_card_color_identity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0004_card_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['name', 'id'], name='cards_card_name_id'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:49
+
+import re
+
+import cards.mana
+from django.db import migrations, models
+
+# cards.mana as of this migration, so later changes to the parser don't change what it writes
+COLORS = 'WUBRG'
+PIP_FIELDS = {code: f'pips_{code.lower()}' for code in COLORS}
+VARIABLE = {'X', 'Y', 'Z'}
+ONE_MANA = {'C', 'S'}
+COST_RE = re.compile(r'(?:\{[^{}]+\})*')
+SYMBOL_RE = re.compile(r'\{([^{}]+)\}')
+
+
+def parse_symbol(symbol):
+    symbol = symbol.upper()
+    if symbol.isdigit():
+        return int(symbol), ''
+    if symbol in VARIABLE:
+        return 0, ''
+    if symbol in ONE_MANA:
+        return 1, ''
+    if symbol in COLORS:
+        return 1, symbol
+    parts = symbol.split('/')
+    colors = ''.join(part for part in parts if part in COLORS)
+    if len(parts) > 1 and colors and all(part in COLORS or part == 'P' or part.isdigit() for part in parts):
+        return max([int(part) for part in parts if part.isdigit()] + [1]), colors
+    raise ValueError(f'Unknown mana symbol {{{symbol}}}')
+
+
+def parse_mana_cost(cost):
+    """
+    (mana value, {color: pips}) for a cost such as '{1}{R}{R}'
+    """
+    if not COST_RE.fullmatch(cost):
+        raise ValueError(f'Malformed mana cost {cost!r}')
+    pips = dict.fromkeys(COLORS, 0)
+    value = 0
+    for symbol in SYMBOL_RE.findall(cost):
+        symbol_value, colors = parse_symbol(symbol)
+        value += symbol_value
+        for color in colors:
+            pips[color] += 1
+    return value, pips
+
+
+def backfill_mana_fields(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    queryset = Card.objects.using(schema_editor.connection.alias)
+    costs = queryset.exclude(mana_cost=None).exclude(mana_cost='').values_list('mana_cost', flat=True)
+    # A catalogue has few distinct costs, so update one cost at a time
+    for cost in costs.order_by().distinct():
+        try:
+            value, pips = parse_mana_cost(cost)
+        except ValueError:
+            continue
+        fields = {PIP_FIELDS[code]: count for code, count in pips.items()}
+        queryset.filter(mana_cost=cost).update(mana_value=value, **fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0005_card_cards_card_name_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='mana_value',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='pips_b',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='pips_g',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='pips_r',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='pips_u',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='pips_w',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='card',
+            name='mana_cost',
+            field=models.CharField(blank=True, max_length=100, null=True, validators=[cards.mana.validate_mana_cost]),
+        ),
+        migrations.RunPython(backfill_mana_fields, migrations.RunPython.noop),
+    ]
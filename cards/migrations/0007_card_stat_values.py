@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:50
+
+from django.db import migrations, models
+
+
+def numeric_stat(value):
+    """
+    cards.models.numeric_stat as of this migration
+    """
+    value = (value or '').strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return None
+
+
+def backfill_stat_values(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    queryset = Card.objects.using(schema_editor.connection.alias)
+    for field in ['power', 'toughness']:
+        values = queryset.exclude(**{field: None}).values_list(field, flat=True)
+        for value in values.order_by().distinct():
+            number = numeric_stat(value)
+            if number is not None:
+                queryset.filter(**{field: value}).update(**{field + '_value': number})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0006_card_mana_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='power_value',
+            field=models.SmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='toughness_value',
+            field=models.SmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_stat_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-16 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0007_card_stat_values'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='card',
+            name='edition',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='cards.edition'),
+        ),
+        migrations.AlterField(
+            model_name='edition',
+            name='code',
+            field=models.CharField(max_length=3, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['edition', 'rarity', 'name'], name='cards_card_edition_rarity'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['rarity', 'name'], name='cards_card_rarity_name'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['type', 'name'], name='cards_card_type_name'),
+        ),
+        migrations.AddIndex(
+            model_name='edition',
+            index=models.Index(fields=['name'], name='cards_edition_name'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:16
+
+from django.db import migrations, models
+
+# cards.facets.FACETS at the time of this migration
+FACETS = {'edition': 'edition_id', 'rarity': 'rarity', 'type': 'type'}
+
+
+def count_facets(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    FacetCount = apps.get_model('cards', 'FacetCount')
+    db_alias = schema_editor.connection.alias
+    for facet, column in FACETS.items():
+        counts = Card.objects.using(db_alias).order_by().values_list(column).annotate(count=models.Count('pk'))
+        FacetCount.objects.using(db_alias).bulk_create(
+            FacetCount(facet=facet, value=str(value), count=count) for value, count in counts.iterator()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0008_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='cards_facetcount_facet_value')],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
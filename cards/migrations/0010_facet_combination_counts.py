@@ -0,0 +1,76 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:22
+
+from collections import Counter
+from itertools import combinations, product
+
+from django.db import migrations, models
+
+# cards.facets and Color.BITS at the time of this migration
+BROWSE_FACETS = ('edition', 'rarity', 'type', 'color')
+COMBINATIONS = [combination for size in range(1, len(BROWSE_FACETS) + 1)
+                for combination in combinations(BROWSE_FACETS, size)]
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+COLORLESS = 'C'
+SEPARATOR = '\x1f'
+SUBTYPE_SEPARATOR = ' — '
+KEY_COLUMNS = ('edition_id', 'rarity', 'type', 'color_identity')
+
+
+def combination_rows(edition_id, rarity, type_line, color_identity):
+    """
+    (combination, facet, filters, value) FacetCombinationCount keys a card is counted under
+    """
+    values = {
+        'edition': [str(edition_id)],
+        'rarity': [rarity],
+        'type': [type_line.split(SUBTYPE_SEPARATOR)[0].strip()],
+        'color': [code for code, bit in COLOR_BITS.items() if color_identity & bit] or [COLORLESS],
+    }
+    for combination in COMBINATIONS:
+        name = '+'.join(combination)
+        for facet in combination:
+            others = [values[other] for other in combination if other != facet]
+            for filters in product(*others):
+                for value in values[facet]:
+                    yield name, facet, SEPARATOR.join(filters), value
+
+
+def count_combinations(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    FacetCombinationCount = apps.get_model('cards', 'FacetCombinationCount')
+    db_alias = schema_editor.connection.alias
+    keys = Card.objects.using(db_alias).order_by().values_list(*KEY_COLUMNS)
+    combined = Counter()
+    for *key, count in keys.annotate(count=models.Count('pk')).iterator():
+        for row in combination_rows(*key):
+            combined[row] += count
+    FacetCombinationCount.objects.using(db_alias).bulk_create(
+        (FacetCombinationCount(combination=combination, facet=facet, filters=filters, value=value, count=count)
+         for (combination, facet, filters, value), count in combined.items()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0009_facet_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCombinationCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('combination', models.CharField(max_length=40)),
+                ('facet', models.CharField(max_length=20)),
+                ('filters', models.CharField(max_length=255)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('combination', 'facet', 'filters', 'value'), name='cards_facetcombination_key')],
+            },
+        ),
+        migrations.RunPython(count_combinations, migrations.RunPython.noop),
+    ]
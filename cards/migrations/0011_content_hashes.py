@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-16 22:57
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+# Card.HASHED_FIELDS and cards.models.content_hash() at the time of this migration
+HASHED_FIELDS = ('name', 'mana_cost', 'text', 'flavor', 'type', 'power', 'toughness', 'rarity', 'set_name',
+                 'image_url', 'edition_id', 'color_identity')
+
+
+def content_hash(values):
+    data = json.dumps(values, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_rows(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    Edition = apps.get_model('cards', 'Edition')
+    db_alias = schema_editor.connection.alias
+    editions = list(Edition.objects.using(db_alias).all())
+    for edition in editions:
+        edition.content_hash = content_hash([edition.name, edition.code])
+    Edition.objects.using(db_alias).bulk_update(editions, ['content_hash'])
+
+    batch = []
+    for pk, *values in Card.objects.using(db_alias).values_list('pk', *HASHED_FIELDS).iterator(chunk_size=2000):
+        batch.append(Card(pk=pk, content_hash=content_hash(values)))
+        if len(batch) == 2000:
+            Card.objects.using(db_alias).bulk_update(batch, ['content_hash'])
+            batch = []
+    Card.objects.using(db_alias).bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0010_facet_combination_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='edition',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(hash_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-17 09:12
+
+from django.db import migrations
+
+# Reindex a card only when an indexed column is updated, not on every slot,
+# identity or hash update
+UPDATE_TRIGGER = """
+    CREATE TRIGGER cards_card_fts_au AFTER UPDATE OF name, type, text, flavor ON cards_card BEGIN
+        INSERT INTO cards_card_fts(cards_card_fts, rowid, name, type, text, flavor)
+        VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+        INSERT INTO cards_card_fts(rowid, name, type, text, flavor)
+        VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+    END"""
+
+OLD_UPDATE_TRIGGER = """
+    CREATE TRIGGER cards_card_fts_au AFTER UPDATE ON cards_card BEGIN
+        INSERT INTO cards_card_fts(cards_card_fts, rowid, name, type, text, flavor)
+        VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+        INSERT INTO cards_card_fts(rowid, name, type, text, flavor)
+        VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+    END"""
+
+
+def replace_trigger(sql):
+    def replace(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cards_card_fts'")
+            if cursor.fetchone() is None:
+                return
+        schema_editor.execute('DROP TRIGGER IF EXISTS cards_card_fts_au')
+        schema_editor.execute(sql)
+    return replace
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0011_content_hashes'),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_trigger(UPDATE_TRIGGER), replace_trigger(OLD_UPDATE_TRIGGER)),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-17 09:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_card_search_update_trigger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='card',
+            name='mana_value',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(django.db.models.functions.text.Lower('type'), models.F('name'), name='cards_card_type_lower_name'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['mana_value', 'name'], name='cards_card_mana_value_name'),
+        ),
+    ]
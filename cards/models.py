@@ -1,6 +1,25 @@
+import hashlib
+import json
 import uuid
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from cards.mana import PIP_FIELDS, parse_mana_cost, validate_mana_cost
+
+
+# Cards per UPDATE when refresh_color_identity() writes identities and hashes back
+REFRESH_BATCH_SIZE = 500
+
+
+def content_hash(values):
+    """
+    Hex digest of a row's content, compared by sync imports to skip unchanged rows
+    """
+    data = json.dumps(values, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
 
 class Color(models.Model):
     RED = 'R'
@@ -9,6 +28,8 @@ class Color(models.Model):
     WHITE = 'W'
     BLACK = 'B'
     COLOR_CHOICES = [(RED, 'Red'), (GREEN, 'Green'), (BLUE, 'Blue'), (WHITE, 'White'), (BLACK, 'Black')]
+    # Bits of Card.color_identity, in WUBRG order
+    BITS = {WHITE: 1, BLUE: 2, BLACK: 4, RED: 8, GREEN: 16}
 
     name = models.CharField(max_length=20)
     code = models.CharField(max_length=3, choices=COLOR_CHOICES)
@@ -16,24 +37,106 @@ class Color(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def mask(cls, codes):
+        mask = 0
+        for code in codes:
+            mask |= cls.BITS[code]
+        return mask
+
+    @classmethod
+    def codes(cls, mask):
+        return [code for code, bit in cls.BITS.items() if mask & bit]
+
 class Edition(models.Model):
     """
     These are constantly added to so we won't lock them into choice fields
     """
     name = models.CharField(max_length=100)
-    code = models.CharField(max_length=3)
+    code = models.CharField(max_length=3, unique=True)
+    # content_hash() of name and code
+    content_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
 
     def __str__(self):
         return f"{self.name}({self.code})"
 
+    def compute_content_hash(self):
+        return content_hash([self.name, self.code])
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.compute_content_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='cards_edition_name'),
+        ]
+
+
+class CardQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Cards for grids and lists: edition joined in and colors prefetched, so
+        rendering never goes back to the database per card
+        """
+        return (self.select_related('edition')
+                .prefetch_related('colors')
+                .only('id', 'name', 'image_url', 'rarity', 'type', 'sample_slot', 'color_identity',
+                      'edition__id', 'edition__name', 'edition__code'))
+
+    def with_exact_colors(self, *codes):
+        """
+        Cards whose colors are exactly codes, e.g. with_exact_colors('R') for mono-red
+        """
+        return self.filter(color_identity=Color.mask(codes))
+
+    def with_colors(self, *codes):
+        """
+        Cards that include every one of codes, possibly alongside others
+        """
+        mask = Color.mask(codes)
+        # Only 32 identities exist, so "contains" is an IN over the indexed column
+        return self.filter(color_identity__in=[value for value in range(32) if value & mask == mask])
+
+    def refresh_color_identity(self):
+        """
+        Recompute color_identity from the colors table for every card in the
+        queryset, and the content hash, which covers it
+        """
+        fields = self.model.HASHED_FIELDS
+        identity = fields.index('color_identity')
+        rows = {pk: values for pk, *values in self.values_list('pk', *fields)}
+        masks = dict.fromkeys(rows, 0)
+        through = self.model.colors.through.objects.filter(card_id__in=masks)
+        for card_id, code in through.values_list('card_id', 'color__code'):
+            masks[card_id] |= Color.BITS.get(code, 0)
+
+        cards = []
+        for pk, values in rows.items():
+            values[identity] = masks[pk]
+            cards.append(self.model(pk=pk, color_identity=masks[pk], content_hash=content_hash(values)))
+        self.model.objects.bulk_update(cards, ['color_identity', 'content_hash'], batch_size=REFRESH_BATCH_SIZE)
+        return masks
+
+
+def numeric_stat(value):
+    """
+    Power/toughness as a number, or None for '*', '1+*', '' and the like
+    """
+    value = (value or '').strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return None
 
 
 class Card(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
-    mana_cost = models.CharField(max_length=100, null=True, blank=True)
+    mana_cost = models.CharField(max_length=100, null=True, blank=True, validators=[validate_mana_cost])
     text = models.TextField(null=True, blank=True)
     flavor = models.TextField(null=True, blank=True)
     type = models.CharField(max_length=100)
@@ -42,12 +145,122 @@ class Card(models.Model):
     rarity = models.CharField(max_length=20)
     set_name = models.CharField(max_length=50)
     image_url = models.URLField(max_length=300)
-    edition = models.ForeignKey(Edition, on_delete=models.CASCADE)
+    # Indexed as the leading column of cards_card_edition_rarity
+    edition = models.ForeignKey(Edition, on_delete=models.CASCADE, db_index=False)
     colors = models.ManyToManyField(Color)
+    # Dense 0..n-1 position used by cards.sampler to pick random cards by index
+    sample_slot = models.PositiveIntegerField(null=True, blank=True, unique=True, editable=False)
+    # Denormalized Color.BITS of colors, kept in step by cards.signals
+    color_identity = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    # Parsed from mana_cost whenever the card is saved, see cards.mana
+    # Indexed as the leading column of cards_card_mana_value_name
+    mana_value = models.PositiveSmallIntegerField(default=0, editable=False)
+    pips_w = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    pips_u = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    pips_b = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    pips_r = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    pips_g = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    # power/toughness as numbers for sorting and range filters; NULL for '*' and non-creatures
+    power_value = models.SmallIntegerField(null=True, blank=True, db_index=True, editable=False)
+    toughness_value = models.SmallIntegerField(null=True, blank=True, db_index=True, editable=False)
+    # content_hash() of HASHED_FIELDS
+    content_hash = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    objects = CardQuerySet.as_manager()
+
+    # Columns computed by refresh_derived_fields(), and the fields they come from
+    DERIVED_FIELDS = ['mana_value', *PIP_FIELDS.values(), 'power_value', 'toughness_value']
+    DERIVED_FROM = {'mana_cost', 'power', 'toughness'}
+    # What a card's content hash covers, in cards.snapshot.TEXT_COLUMNS order then edition and colors
+    HASHED_FIELDS = ['name', 'mana_cost', 'text', 'flavor', 'type', 'power', 'toughness', 'rarity', 'set_name',
+                     'image_url', 'edition_id', 'color_identity']
+    # Names save(update_fields=...) may give them by
+    HASHED_FROM = {*HASHED_FIELDS, 'edition'}
 
     @property
     def color_count(self):
-        return self.colors.count()
+        return self.color_identity.bit_count()
+
+    @property
+    def color_codes(self):
+        return Color.codes(self.color_identity)
+
+    def compute_content_hash(self):
+        return content_hash([getattr(self, attname) for attname in self.HASHED_FIELDS])
+
+    def refresh_derived_fields(self):
+        cost = parse_mana_cost(self.mana_cost)
+        self.mana_value = cost.value
+        for code, count in cost.pip_counts().items():
+            setattr(self, PIP_FIELDS[code], count)
+        self.power_value = numeric_stat(self.power)
+        self.toughness_value = numeric_stat(self.toughness)
+
+    def save(self, *args, **kwargs):
+        # The pre_save handler refreshes the derived columns; make sure they get written
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.DERIVED_FROM.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        # The pre_save handler also rehashes the card
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.HASHED_FROM.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        indexes = [
+            # Keyset pagination in cards.api seeks on (name, id)
+            models.Index(fields=['name', 'id'], name='cards_card_name_id'),
+            # Admin filters (edition, rarity, type) with the default name ordering
+            models.Index(fields=['edition', 'rarity', 'name'], name='cards_card_edition_rarity'),
+            models.Index(fields=['rarity', 'name'], name='cards_card_rarity_name'),
+            models.Index(fields=['type', 'name'], name='cards_card_type_name'),
+            # Case-insensitive type line prefixes in cards.api, as a range on LOWER(type)
+            models.Index(Lower('type'), F('name'), name='cards_card_type_lower_name'),
+            # Mana value filters in cards.api with the name ordering
+            models.Index(fields=['mana_value', 'name'], name='cards_card_mana_value_name'),
+        ]
+
+
+class FacetCount(models.Model):
+    """
+    Number of cards per edition, rarity and type line, kept current by cards.facets
+    """
+    facet = models.CharField(max_length=20)
+    # Edition pk as a string for the edition facet
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='cards_facetcount_facet_value'),
+        ]
+
+
+class FacetCombinationCount(models.Model):
+    """
+    Number of cards with one value of a browse facet among the cards matching
+    given values of other facets, kept current by cards.facets
+    """
+    # The facets involved, e.g. 'edition+rarity+color'
+    combination = models.CharField(max_length=40)
+    facet = models.CharField(max_length=20)
+    # Values of the combination's other facets, in order
+    filters = models.CharField(max_length=255)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"{self.facet}={self.value} in {self.combination}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['combination', 'facet', 'filters', 'value'],
+                                    name='cards_facetcombination_key'),
+        ]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import connections
+
+REPLICA = 'replica'
+# Models whose reads can be served by the read-only connection
+REPLICA_MODELS = {'card', 'edition'}
+
+
+class ReadReplicaRouter:
+    """
+    Sends Card and Edition reads to the read-only 'replica' connection.
+
+    The replica is a second connection to the same SQLite file (see settings_production),
+    so with WAL readers never wait on an import holding the write lock. Reads inside an
+    open transaction on default stay there so they see their own uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES:
+            return None
+        if model._meta.app_label != 'cards' or model._meta.model_name not in REPLICA_MODELS:
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases point at the same file
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
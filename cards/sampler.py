@@ -0,0 +1,145 @@
+"""
+Random card sampling without ORDER BY RANDOM().
+
+Every card owns a slot in the dense range 0..n-1 (Card.sample_slot). Picking k
+random cards is then a Max() over the unique slot index plus a single
+slot__in lookup, whatever the size of the catalogue. The signal handlers in
+cards.signals keep the range dense as cards come and go.
+"""
+import random
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from cards.models import Card
+
+SAMPLE_SIZE = 9
+ASSIGN_RETRIES = 3
+BATCH_SIZE = 2000
+
+
+def slot_count():
+    top = Card.objects.aggregate(top=Max('sample_slot'))['top']
+    return 0 if top is None else top + 1
+
+
+def sample_cards(k=SAMPLE_SIZE, queryset=None):
+    """
+    Return up to k distinct random cards from queryset (Card.objects by default)
+    """
+    if queryset is None:
+        queryset = Card.objects.all()
+
+    count = slot_count()
+    if count <= k:
+        # Every slot is below count; a range (unlike IS NOT NULL) is served by the index
+        cards = list(queryset.filter(sample_slot__lt=count))
+        random.shuffle(cards)
+        return cards
+
+    picks = random.sample(range(count), k)
+    by_slot = {card.sample_slot: card for card in queryset.filter(sample_slot__in=picks)}
+    cards = [by_slot[slot] for slot in picks if slot in by_slot]
+
+    # Holes only show up if the slots drifted (see rebuild_slots). Top up from
+    # the slots following a random offset, wrapping round once.
+    for start in (random.randrange(count), 0):
+        if len(cards) >= k:
+            break
+        extra = (queryset.exclude(pk__in=[card.pk for card in cards])
+                 .filter(sample_slot__gte=start)
+                 .order_by('sample_slot')[:k - len(cards)])
+        cards.extend(extra)
+    return cards
+
+
+async def asample_cards(k=SAMPLE_SIZE, queryset=None):
+    """
+    sample_cards() for async views, run in a worker thread so there is one copy of the sampling
+    """
+    return await sync_to_async(sample_cards)(k, queryset)
+
+
+def assign_slot(card):
+    """
+    Give a card without a slot the next free one at the end of the range
+    """
+    for attempt in range(ASSIGN_RETRIES):
+        try:
+            with transaction.atomic():
+                slot = slot_count()
+                updated = Card.objects.filter(pk=card.pk, sample_slot__isnull=True).update(sample_slot=slot)
+        except IntegrityError:
+            # Another writer took the same slot first
+            if attempt == ASSIGN_RETRIES - 1:
+                raise
+        else:
+            card.sample_slot = slot if updated else stored_slot(card.pk)
+            return card.sample_slot
+
+
+def stored_slot(pk):
+    return Card.objects.filter(pk=pk).values_list('sample_slot', flat=True).first()
+
+
+def release_slot(slot):
+    """
+    Fill the hole left by a deleted card with the card holding the last slot
+    """
+    if slot is None:
+        return
+    with transaction.atomic():
+        last = slot_count() - 1
+        # A hole past the end is already outside the range, e.g. when several
+        # cards are deleted in one go and the last slot was one of them.
+        if last > slot:
+            Card.objects.filter(sample_slot=last).update(sample_slot=slot)
+
+
+def release_slots(slots):
+    """
+    release_slot() for many deleted cards at once: the cards holding the last
+    slots fill the holes, with one UPDATE per batch
+    """
+    slots = {slot for slot in slots if slot is not None}
+    if not slots:
+        return
+    with transaction.atomic():
+        count = slot_count()
+        holes = sorted(slot for slot in slots if slot < count)
+        last = Card.objects.filter(sample_slot__isnull=False).order_by('-sample_slot')
+        moved = []
+        for hole, (pk, slot) in zip(holes, last.values_list('pk', 'sample_slot')[:len(holes)]):
+            if slot < hole:
+                break
+            moved.append(Card(pk=pk, sample_slot=hole))
+        Card.objects.bulk_update(moved, ['sample_slot'], batch_size=BATCH_SIZE)
+
+
+def fill_missing_slots():
+    """
+    Append every card without a slot (bulk_create skips the signals) to the range
+    """
+    next_slot = slot_count()
+    missing = Card.objects.filter(sample_slot__isnull=True).order_by('pk').values_list('pk', flat=True)
+    batch = []
+    with transaction.atomic():
+        for pk in missing.iterator(chunk_size=BATCH_SIZE):
+            batch.append(Card(pk=pk, sample_slot=next_slot))
+            next_slot += 1
+            if len(batch) >= BATCH_SIZE:
+                Card.objects.bulk_update(batch, ['sample_slot'])
+                batch = []
+        if batch:
+            Card.objects.bulk_update(batch, ['sample_slot'])
+    return next_slot
+
+
+def rebuild_slots():
+    """
+    Renumber every card from scratch
+    """
+    with transaction.atomic():
+        Card.objects.update(sample_slot=None)
+        return fill_missing_slots()
@@ -0,0 +1,126 @@
+"""
+Full-text card search backed by the cards_card_fts FTS5 table.
+
+The FTS table uses cards_card as external content and triggers keep it in
+step, so rows written by bulk_create or raw SQL are indexed as well. Updates
+only reindex a card when one of the indexed columns is set, so bulk updates of
+slots, identities and hashes leave the FTS table alone. Other
+database backends fall back to icontains matching over the same columns.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+
+FTS_TABLE = 'cards_card_fts'
+SEARCH_FIELDS = ['name', 'type', 'text', 'flavor']
+# bm25() column weights, in SEARCH_FIELDS order: a hit in the name ranks highest
+WEIGHTS = (10.0, 3.0, 1.0, 0.5)
+RESULT_LIMIT = 60
+
+TOKEN_RE = re.compile(r'\w+')
+
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON cards_card BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, type, text, flavor)
+            VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON cards_card BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, type, text, flavor)
+            VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, type, text, flavor ON cards_card BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, type, text, flavor)
+            VALUES ('delete', old.rowid, old.name, old.type, old.text, old.flavor);
+            INSERT INTO {FTS_TABLE}(rowid, name, type, text, flavor)
+            VALUES (new.rowid, new.name, new.type, new.text, new.flavor);
+        END""",
+}
+
+
+def is_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query where every word has to match as a prefix,
+    e.g. 'gob ki' -> '"gob"* "ki"*'
+    """
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+
+def fallback_filter(query):
+    condition = Q()
+    for token in TOKEN_RE.findall(query):
+        condition &= Q(*[Q(**{f'{field}__icontains': token}) for field in SEARCH_FIELDS], _connector=Q.OR)
+    return condition
+
+
+def filter_cards(queryset, query):
+    """
+    Narrow queryset to the cards matching query, keeping its own ordering
+    """
+    expression = match_expression(query)
+    if not expression:
+        return queryset
+    if not is_available(queryset.db):
+        return queryset.filter(fallback_filter(query))
+    # A plain join: SQLite drives it from the MATCH scan and looks cards up by rowid
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = cards_card.rowid', f'{FTS_TABLE} MATCH %s'],
+        params=[expression],
+    )
+
+
+def rank_cards(queryset, query):
+    """
+    filter_cards() plus a search_rank annotation to order by (lower is better)
+    """
+    queryset = filter_cards(queryset, query)
+    if not match_expression(query) or not is_available(queryset.db):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    weights = ', '.join(str(weight) for weight in WEIGHTS)
+    return queryset.extra(select={'search_rank': f'bm25({FTS_TABLE}, {weights})'})
+
+
+def search_cards(query, queryset, limit=RESULT_LIMIT):
+    """
+    The best `limit` matches for query from queryset, most relevant first
+    """
+    if not match_expression(query):
+        return []
+    return list(rank_cards(queryset, query).order_by('search_rank', 'name')[:limit])
+
+
+async def asearch_cards(query, queryset, limit=RESULT_LIMIT):
+    """
+    search_cards() for async views
+    """
+    if not match_expression(query):
+        return []
+    return [card async for card in rank_cards(queryset, query).order_by('search_rank', 'name')[:limit]]
+
+
+def ensure_triggers(using='default'):
+    """
+    Recreate the sync triggers if a migration rebuilt cards_card (SQLite drops a
+    table's triggers with it) and reindex, since the rowids will have changed
+    """
+    connection = connections[using]
+    if not is_available(using):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       (f'{FTS_TABLE}%',))
+        existing = {name for name, in cursor.fetchall()}
+        if FTS_TABLE not in existing or existing.issuperset(TRIGGERS):
+            return False
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
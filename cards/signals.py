@@ -0,0 +1,119 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from cards import cache, facets, instrumentation, sampler, search
+from cards.models import Card, Color, Edition
+
+
+@receiver(pre_save, sender=Card)
+def refresh_derived_fields(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or Card.DERIVED_FROM.intersection(update_fields):
+        instance.refresh_derived_fields()
+
+
+@receiver(pre_save, sender=Card)
+def keep_denormalized_fields(sender, instance, raw=False, **kwargs):
+    # loaddata builds instances from scratch and saves them over the stored row,
+    # which would reset the columns maintained here (or clash on another db's slots)
+    if raw:
+        stored = Card.objects.filter(pk=instance.pk).values('sample_slot', 'color_identity').first()
+        if stored:
+            instance.sample_slot = stored['sample_slot']
+            instance.color_identity = stored['color_identity']
+        else:
+            instance.sample_slot = None
+    elif instance.sample_slot is None and not instance._state.adding:
+        instance.sample_slot = sampler.stored_slot(instance.pk)
+
+
+@receiver(pre_save, sender=Card)
+def refresh_content_hash(sender, instance, update_fields=None, **kwargs):
+    # After keep_denormalized_fields, which may restore color_identity
+    if update_fields is None or Card.HASHED_FROM.intersection(update_fields):
+        instance.content_hash = instance.compute_content_hash()
+
+
+@receiver(pre_save, sender=Card)
+def remember_facet_values(sender, instance, update_fields=None, **kwargs):
+    # What the card is counted under now, for card_saved to move it from; None
+    # for a new card. loaddata's instances claim to be new, so ask the database.
+    if update_fields is None or facets.KEY_FIELDS.intersection(update_fields):
+        instance._stored_facets = facets.stored_keys([instance.pk]).get(instance.pk)
+
+
+@receiver(post_save, sender=Card)
+def card_saved(sender, instance, **kwargs):
+    if instance.sample_slot is None:
+        sampler.assign_slot(instance)
+    if '_stored_facets' in instance.__dict__:
+        facets.card_moved(instance.__dict__.pop('_stored_facets'), facets.card_key(instance))
+    cache.invalidate_card(instance.pk)
+
+
+@receiver(post_delete, sender=Card)
+def card_deleted(sender, instance, **kwargs):
+    sampler.release_slot(instance.sample_slot)
+    facets.card_moved(facets.card_key(instance), None)
+    cache.invalidate_card(instance.pk)
+
+
+@receiver(post_save, sender=Edition)
+@receiver(post_delete, sender=Edition)
+def edition_changed(sender, instance, **kwargs):
+    cache.invalidate_edition(instance.pk)
+
+
+@receiver(post_save, sender=Color)
+@receiver(post_delete, sender=Color)
+def color_changed(sender, instance, **kwargs):
+    cache.invalidate_colors()
+
+
+def refresh_color_identity(pks):
+    # The stored identities are still the old ones, for the facet counts to move from
+    old_keys = facets.stored_keys(pks)
+    masks = Card.objects.filter(pk__in=pks).refresh_color_identity()
+    facets.colors_changed(old_keys, masks)
+    return masks
+
+
+@receiver(m2m_changed, sender=Card.colors.through)
+def card_colors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # instance is a Color and pk_set holds cards; clear() gives no pk_set
+        if action == 'pre_clear':
+            instance._cleared_card_pks = list(instance.card_set.values_list('pk', flat=True))
+        elif action in ('post_add', 'post_remove'):
+            refresh_color_identity(pk_set)
+        elif action == 'post_clear':
+            refresh_color_identity(instance.__dict__.pop('_cleared_card_pks', []))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        masks = refresh_color_identity([instance.pk])
+        instance.color_identity = masks.get(instance.pk, 0)
+    if action.startswith('post_'):
+        # Tiles don't show colors, but the in-memory catalogue holds color_identity
+        cache.invalidate_catalogue()
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # Migrations that rebuild cards_card on SQLite take the FTS triggers with it
+    if sender.label == 'cards':
+        search.ensure_triggers(using)
+
+
+@receiver(connection_created)
+def instrument_queries(sender, connection, **kwargs):
+    instrumentation.install(connection)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # Databases opt in with a PRAGMAS dict next to ENGINE/NAME, see settings_production
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
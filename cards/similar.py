@@ -0,0 +1,511 @@
+"""
+"Cards like this one", from an index of per-card NumPy feature vectors.
+
+Each card becomes a unit float32 vector of FEATURE_DIMS, in blocks that are
+normalized on their own and then weighted by BLOCK_WEIGHTS:
+
+    colors      one dimension per color, or colorless
+    mana value  a point on a quarter circle, so close values score close to 1
+    type line   TF-IDF of its words
+    rules text  TF-IDF of its words and mana symbols, with the card's own name
+                taken out so "When Goblin King ..." matches "When Elf King ..."
+
+The TF-IDF vocabularies are fitted when the index is built and folded into a
+few dimensions by a fixed random +-1 projection, so a dot product of two
+vectors is (close to) their weighted cosine similarity.
+
+`manage.py rebuild_similar` writes the index under CARDS_SIMILAR_ROOT. The
+vectors are one .npy matrix, memory-mapped by readers, with its rows grouped
+by spherical k-means cluster. A query scores the cluster centroids and then
+only the rows of the PROBES nearest clusters, a few thousand rows however big
+the catalogue. `--extend` leaves those files alone: it masks out the rows of
+changed and deleted cards (found by content hash) and vectorizes new and
+changed cards into a small tail that every query scans in full. Past
+TAIL_SHARE of the catalogue the tail costs more than it saves and extending
+rebuilds instead.
+
+Each build or extension is a new directory, published by replacing the
+CURRENT file that names it; processes reopen the index when CURRENT changes.
+
+Needs NumPy (`pip install numpy`); without it there are no recommendations.
+"""
+import contextlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+
+from cards.models import Card, Color
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COLORS = slice(0, 6)
+MANA = slice(6, 8)
+TYPE = slice(8, 32)
+TEXT = slice(32, 64)
+FEATURE_DIMS = 64
+BLOCK_WEIGHTS = [(COLORS, 1.0), (MANA, 0.5), (TYPE, 1.0), (TEXT, 1.2)]
+COLOR_BITS = [Color.BITS[code] for code in 'WUBRG']
+# Mana values from here up count as the same
+MANA_CAP = 10
+
+TYPE_TERMS = 1024
+TEXT_TERMS = 8192
+# Text words on fewer cards than this are left out of the vocabulary
+MIN_DOCUMENTS = 2
+TYPE_RE = re.compile(r"[a-z][a-z'-]*")
+TEXT_RE = re.compile(r"\{[^}]*\}|[+-]?[\dx*]+/[+-]?[\dx*]+|[a-z][a-z'-]*|\d+")
+
+# Seeds the vocabulary projections and k-means, so rebuilding the same cards gives the same index
+SEED = 20
+MAX_CLUSTERS = 4096
+# k-means trains on up to this many rows per cluster
+TRAINING_ROWS = 64
+KMEANS_ROUNDS = 8
+PROBES = 16
+CHUNK_SIZE = 10000
+# Tail share of the indexed cards past which extending rebuilds instead
+TAIL_SHARE = 0.1
+TAIL_MIN = 10000
+
+CURRENT = 'CURRENT'
+# Written once by a build and shared by the extensions of it
+MAIN_FILES = ['vectors.npy', 'ids.npy', 'hashes.npy', 'centroids.npy', 'offsets.npy', 'vocabulary.json',
+              'text_idf.npy', 'text_projection.npy', 'type_idf.npy', 'type_projection.npy']
+
+
+class CardRow(NamedTuple):
+    id: uuid.UUID
+    content_hash: str
+    name: str
+    type: str
+    text: str
+    mana_value: int
+    color_identity: int
+
+    @classmethod
+    def of(cls, card):
+        return cls(*(getattr(card, field) for field in cls._fields))
+
+
+def type_terms(row):
+    return TYPE_RE.findall(row.type.lower())
+
+
+def text_terms(row):
+    text = (row.text or '').lower()
+    if row.name:
+        text = text.replace(row.name.lower(), ' ')
+    return TEXT_RE.findall(text)
+
+
+def hash_prefix(digest):
+    """
+    The first 64 bits of a content hash
+    """
+    return int(digest[:16], 16) if digest else 0
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+    return vectors
+
+
+class Vocabulary:
+    """
+    Inverse document frequencies of up to `size` terms and the random +-1
+    projection that folds their TF-IDF weights into `dims` dimensions
+    """
+    def __init__(self, terms, idf, projection):
+        self.terms = terms
+        self.positions = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.projection = projection
+
+    @classmethod
+    def fit(cls, documents, counts, size, dims, rng, min_documents=1):
+        """
+        counts: the number of the `documents` cards each term appears on
+        """
+        terms = [term for term, n in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:size]
+                 if n >= min_documents]
+        frequencies = np.array([counts[term] for term in terms], dtype=np.float32)
+        idf = (np.log((1 + documents) / (1 + frequencies)) + 1).astype(np.float32)
+        projection = rng.choice(np.array([-1, 1], dtype=np.float32), size=(len(terms), dims))
+        return cls(terms, idf, projection)
+
+    @classmethod
+    def load(cls, path, name, terms):
+        return cls(terms, np.load(path / f'{name}_idf.npy'), np.load(path / f'{name}_projection.npy'))
+
+    def save(self, path, name):
+        np.save(path / f'{name}_idf.npy', self.idf)
+        np.save(path / f'{name}_projection.npy', self.projection)
+
+    def project(self, documents):
+        """
+        The projected, sublinear TF-IDF weights of each list of terms in documents
+        """
+        out = np.zeros((len(documents), self.projection.shape[1]), dtype=np.float32)
+        rows, columns, frequencies = [], [], []
+        for row, terms in enumerate(documents):
+            for term, count in Counter(terms).items():
+                column = self.positions.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    frequencies.append(count)
+        if not rows:
+            return out
+        rows = np.array(rows)
+        columns = np.array(columns)
+        weights = (1 + np.log(np.array(frequencies, dtype=np.float32))) * self.idf[columns]
+        # rows is sorted, so each document's terms are one run to sum
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        out[rows[starts]] = np.add.reduceat(self.projection[columns] * weights[:, None], starts)
+        return out
+
+
+def features(rows, text_vocabulary, type_vocabulary):
+    """
+    The (len(rows), FEATURE_DIMS) float32 feature vectors of a list of CardRows
+    """
+    vectors = np.zeros((len(rows), FEATURE_DIMS), dtype=np.float32)
+    masks = np.fromiter((row.color_identity for row in rows), dtype=np.int64, count=len(rows))
+    vectors[:, 0:5] = (masks[:, None] & np.array(COLOR_BITS)) != 0
+    vectors[:, 5] = masks == 0
+    mana = np.fromiter((row.mana_value for row in rows), dtype=np.float32, count=len(rows))
+    angles = np.minimum(mana, MANA_CAP) / MANA_CAP * (np.pi / 2)
+    vectors[:, MANA.start] = np.cos(angles)
+    vectors[:, MANA.start + 1] = np.sin(angles)
+    vectors[:, TYPE] = type_vocabulary.project([type_terms(row) for row in rows])
+    vectors[:, TEXT] = text_vocabulary.project([text_terms(row) for row in rows])
+    for block, weight in BLOCK_WEIGHTS:
+        vectors[:, block] = normalize(vectors[:, block]) * weight
+    return normalize(vectors)
+
+
+def id_array(pks):
+    return np.array([pk.bytes for pk in pks], dtype='S16')
+
+
+def to_uuid(value):
+    # 'S16' drops trailing NUL bytes
+    return uuid.UUID(bytes=value.ljust(16, b'\0'))
+
+
+def nearest_centroids(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    # Scores a block at a time, to bound the (rows, clusters) matrix
+    step = max(1, 2 ** 22 // max(len(centroids), 1))
+    for start in range(0, len(vectors), step):
+        labels[start:start + step] = np.argmax(vectors[start:start + step] @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(vectors, clusters, rng):
+    """
+    Spherical k-means centroids of a sample of the unit rows of vectors
+    """
+    sample_size = min(len(vectors), clusters * TRAINING_ROWS)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, clusters, replace=False)].copy()
+    for _ in range(KMEANS_ROUNDS):
+        labels = nearest_centroids(sample, centroids)
+        order = np.argsort(labels, kind='stable')
+        present, starts = np.unique(labels[order], return_index=True)
+        # Clusters left empty keep their centroid
+        centroids[present] = normalize(np.add.reduceat(sample[order], starts))
+    return centroids
+
+
+def write_index(path, rows):
+    """
+    Build an index in the empty directory path from rows, a callable returning
+    an iterable of CardRows. It is called twice and must give as many cards:
+    the vocabularies are fitted to the first pass and the second is indexed.
+    """
+    text_counts, type_counts = Counter(), Counter()
+    documents = 0
+    for row in rows():
+        text_counts.update(set(text_terms(row)))
+        type_counts.update(set(type_terms(row)))
+        documents += 1
+    rng = np.random.default_rng(SEED)
+    text_vocabulary = Vocabulary.fit(documents, text_counts, TEXT_TERMS, TEXT.stop - TEXT.start, rng,
+                                     MIN_DOCUMENTS)
+    type_vocabulary = Vocabulary.fit(documents, type_counts, TYPE_TERMS, TYPE.stop - TYPE.start, rng)
+
+    unsorted = np.lib.format.open_memmap(path / 'unsorted.npy', mode='w+', dtype=np.float32,
+                                         shape=(documents, FEATURE_DIMS))
+    ids = np.zeros(documents, dtype='S16')
+    hashes = np.zeros(documents, dtype=np.uint64)
+    done = 0
+    chunk = []
+    for row in rows():
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            done = write_chunk(chunk, done, unsorted, ids, hashes, text_vocabulary, type_vocabulary)
+            chunk = []
+    done = write_chunk(chunk, done, unsorted, ids, hashes, text_vocabulary, type_vocabulary)
+    if done != documents:
+        raise ValueError('The cards changed while they were being indexed')
+
+    clusters = min(MAX_CLUSTERS, max(1, math.isqrt(documents)))
+    if documents:
+        centroids = kmeans(unsorted, clusters, rng)
+        labels = np.concatenate([nearest_centroids(unsorted[start:start + CHUNK_SIZE], centroids)
+                                 for start in range(0, documents, CHUNK_SIZE)])
+    else:
+        centroids = np.zeros((0, FEATURE_DIMS), dtype=np.float32)
+        labels = np.zeros(0, dtype=np.int32)
+    order = np.argsort(labels, kind='stable')
+    offsets = np.r_[0, np.cumsum(np.bincount(labels, minlength=len(centroids)))].astype(np.int64)
+
+    vectors = np.lib.format.open_memmap(path / 'vectors.npy', mode='w+', dtype=np.float32,
+                                        shape=(documents, FEATURE_DIMS))
+    for start in range(0, documents, CHUNK_SIZE):
+        vectors[start:start + CHUNK_SIZE] = unsorted[order[start:start + CHUNK_SIZE]]
+    vectors.flush()
+    del vectors, unsorted
+    os.remove(path / 'unsorted.npy')
+
+    np.save(path / 'ids.npy', ids[order])
+    np.save(path / 'hashes.npy', hashes[order])
+    np.save(path / 'centroids.npy', centroids)
+    np.save(path / 'offsets.npy', offsets)
+    text_vocabulary.save(path, 'text')
+    type_vocabulary.save(path, 'type')
+    with open(path / 'vocabulary.json', 'w', encoding='utf-8') as fp:
+        json.dump({'text': text_vocabulary.terms, 'type': type_vocabulary.terms}, fp)
+    write_tail(path, np.zeros(documents, dtype=bool), np.zeros((0, FEATURE_DIMS), dtype=np.float32),
+               np.zeros(0, dtype='S16'), np.zeros(0, dtype=np.uint64))
+    return {'cards': documents, 'clusters': len(centroids), 'tail': 0, 'dropped': 0}
+
+
+def write_chunk(chunk, start, vectors, ids, hashes, text_vocabulary, type_vocabulary):
+    end = start + len(chunk)
+    if end > len(vectors):
+        raise ValueError('The cards changed while they were being indexed')
+    if chunk:
+        vectors[start:end] = features(chunk, text_vocabulary, type_vocabulary)
+        ids[start:end] = id_array(row.id for row in chunk)
+        hashes[start:end] = [hash_prefix(row.content_hash) for row in chunk]
+    return end
+
+
+def write_tail(path, dropped, vectors, ids, hashes):
+    np.save(path / 'dropped.npy', dropped)
+    np.save(path / 'tail_vectors.npy', vectors)
+    np.save(path / 'tail_ids.npy', ids)
+    np.save(path / 'tail_hashes.npy', hashes)
+
+
+class SimilarityIndex:
+    def __init__(self, path):
+        self.path = path
+        self.vectors = np.load(path / 'vectors.npy', mmap_mode='r')
+        self.ids = np.load(path / 'ids.npy', mmap_mode='r')
+        self.centroids = np.load(path / 'centroids.npy')
+        self.offsets = np.load(path / 'offsets.npy')
+        self.dropped = np.load(path / 'dropped.npy')
+        self.tail_vectors = np.load(path / 'tail_vectors.npy')
+        self.tail_ids = np.load(path / 'tail_ids.npy')
+        with open(path / 'vocabulary.json', encoding='utf-8') as fp:
+            terms = json.load(fp)
+        self.text_vocabulary = Vocabulary.load(path, 'text', terms['text'])
+        self.type_vocabulary = Vocabulary.load(path, 'type', terms['type'])
+
+    def __len__(self):
+        return len(self.ids) - int(self.dropped.sum()) + len(self.tail_ids)
+
+    def vector(self, card):
+        return features([CardRow.of(card)], self.text_vocabulary, self.type_vocabulary)[0]
+
+    def search(self, vector, limit, exclude=None):
+        """
+        (card id, score) of the `limit` indexed cards most like vector, best
+        first, leaving out the card with id exclude
+        """
+        probes = min(PROBES, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes] if probes else []
+        spans = [(self.offsets[cluster], self.offsets[cluster + 1]) for cluster in clusters]
+        vectors = np.concatenate([self.vectors[start:end] for start, end in spans] + [self.tail_vectors])
+        ids = np.concatenate([self.ids[start:end] for start, end in spans] + [self.tail_ids])
+        live = np.concatenate([~self.dropped[start:end] for start, end in spans]
+                              + [np.ones(len(self.tail_ids), dtype=bool)])
+        if exclude is not None:
+            live &= ids != exclude.bytes.rstrip(b'\0')
+        scores = vectors @ vector
+        scores[~live] = -np.inf
+        if limit < len(scores):
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(to_uuid(ids[i]), float(scores[i])) for i in best if live[i]]
+
+    def similar_to(self, card, limit):
+        """
+        Ids of the `limit` cards most like card, most similar first
+        """
+        return [pk for pk, _ in self.search(self.vector(card), limit, exclude=card.pk)]
+
+
+def root_path(root=None):
+    return Path(root or settings.CARDS_SIMILAR_ROOT)
+
+
+def publish(root, path):
+    """
+    Make the index in path current and remove the ones it replaces. Processes
+    still reading those keep their memory maps until they reopen.
+    """
+    pointer = root / f'{CURRENT}.tmp'
+    pointer.write_text(path.name)
+    os.replace(pointer, root / CURRENT)
+    for old in root.glob('index-*'):
+        if old != path:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def card_rows(queryset=None):
+    queryset = Card.objects.all() if queryset is None else queryset
+    return (CardRow._make(values) for values in
+            queryset.order_by().values_list(*CardRow._fields).iterator(chunk_size=CHUNK_SIZE))
+
+
+def read_snapshot():
+    """
+    Where the passes over the cards run. On the replica connection (see
+    cards.routers) a read transaction is a snapshot that takes no write lock.
+    A transaction on default would take it, since settings_production begins
+    transactions IMMEDIATE, so there the reads run unwrapped: write_index()
+    checks that both passes saw as many cards, and every vector is stored
+    with the hash of the row it came from, for --extend to catch up with.
+    """
+    alias = router.db_for_read(Card)
+    if alias == DEFAULT_DB_ALIAS:
+        return contextlib.nullcontext()
+    return transaction.atomic(using=alias)
+
+
+def build(root=None):
+    """
+    Index every card, replacing the current index. Returns its counts.
+    """
+    root = root_path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix='index-', dir=root))
+    try:
+        with read_snapshot():
+            stats = write_index(path, card_rows)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    publish(root, path)
+    return stats
+
+
+def extend(root=None):
+    """
+    Bring the current index up to date with the cards table without
+    rebuilding it, or rebuild it if there is none or the tail grows too long
+    """
+    root = root_path(root)
+    index = open_index(root)
+    if index is None:
+        return {**build(root), 'rebuilt': True}
+
+    with read_snapshot():
+        hashes = np.load(index.path / 'hashes.npy')
+        tail_hashes = np.load(index.path / 'tail_hashes.npy')
+        tail_positions = {value: i for i, value in enumerate(index.tail_ids)}
+        sorter = np.argsort(index.ids)
+        sorted_ids = index.ids[sorter]
+        seen = np.zeros(len(index.ids), dtype=bool)
+        kept = np.zeros(len(index.tail_ids), dtype=bool)
+        stale = []
+        pairs = Card.objects.order_by().values_list('id', 'content_hash').iterator(chunk_size=CHUNK_SIZE)
+        while chunk := [pair for _, pair in zip(range(CHUNK_SIZE), pairs)]:
+            ids = id_array(pk for pk, _ in chunk)
+            chunk_hashes = np.array([hash_prefix(digest) for _, digest in chunk], dtype=np.uint64)
+            positions = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+            rows = sorter[positions] if len(sorted_ids) else positions
+            current = np.zeros(len(chunk), dtype=bool)
+            if len(sorted_ids):
+                current = ((sorted_ids[positions] == ids) & (hashes[rows] == chunk_hashes)
+                           & ~index.dropped[rows])
+            seen[rows[current]] = True
+            for i in np.flatnonzero(~current):
+                position = tail_positions.get(ids[i])
+                if position is not None and tail_hashes[position] == chunk_hashes[i]:
+                    kept[position] = True
+                else:
+                    stale.append(chunk[i][0])
+
+        rebuild = kept.sum() + len(stale) > max(TAIL_MIN, TAIL_SHARE * len(index.ids))
+        if not rebuild:
+            new_rows = []
+            for start in range(0, len(stale), CHUNK_SIZE):
+                new_rows.extend(card_rows(Card.objects.filter(pk__in=stale[start:start + CHUNK_SIZE])))
+            vectors = features(new_rows, index.text_vocabulary, index.type_vocabulary)
+    if rebuild:
+        return {**build(root), 'rebuilt': True}
+
+    path = Path(tempfile.mkdtemp(prefix='index-', dir=root))
+    try:
+        for name in MAIN_FILES:
+            try:
+                os.link(index.path / name, path / name)
+            except OSError:
+                shutil.copy2(index.path / name, path / name)
+        write_tail(
+            path, ~seen,
+            np.concatenate([index.tail_vectors[kept], vectors]),
+            np.concatenate([index.tail_ids[kept], id_array(row.id for row in new_rows)]),
+            np.concatenate([tail_hashes[kept],
+                            np.array([hash_prefix(row.content_hash) for row in new_rows], dtype=np.uint64)]),
+        )
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    publish(root, path)
+    return {'cards': int(seen.sum() + kept.sum()) + len(new_rows), 'clusters': len(index.centroids),
+            'tail': int(kept.sum()) + len(new_rows), 'dropped': int((~seen).sum()), 'added': len(new_rows),
+            'rebuilt': False}
+
+
+_index = None
+
+
+def open_index(root=None):
+    """
+    The current index, reopened when CURRENT names a new one, or None
+    without one or without NumPy
+    """
+    global _index
+    if np is None:
+        return None
+    root = root_path(root)
+    try:
+        name = (root / CURRENT).read_text().strip()
+        index = _index
+        if index is None or index.path != root / name:
+            index = _index = SimilarityIndex(root / name)
+    except FileNotFoundError:
+        return None
+    return index
@@ -0,0 +1,83 @@
+"""
+Synthetic catalogues for benchmarks, modelled on a real card fixture.
+
+Every synthetic card copies a randomly drawn fixture card, so type, cost,
+power/toughness, rarity, text and colors keep the fixture's joint distribution.
+Names are recombined from the fixture's name words and cards are spread evenly
+over new editions. The output is fixture objects for cards.loading.CardLoader.
+"""
+import random
+import uuid
+from itertools import chain
+
+from django.db.models import Max
+
+from cards.models import Color, Edition
+
+CODE_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# The fixture has about this many cards per edition
+CARDS_PER_EDITION = 375
+
+
+class SyntheticCatalogue:
+    def __init__(self, fixture_objects, seed=None):
+        self.random = random.Random(seed)
+        self.colors = [obj for obj in fixture_objects if obj['model'] == 'cards.color']
+        self.templates = [obj['fields'] for obj in fixture_objects if obj['model'] == 'cards.card']
+        if not self.templates:
+            raise ValueError('The fixture has no cards to model')
+        words = [fields['name'].split() for fields in self.templates if fields['name'].split()]
+        self.first_words = [name[0] for name in words]
+        self.last_words = [name[-1] for name in words]
+
+    def color_ids(self):
+        """
+        Map the fixture's color pks onto this database's colors, creating any missing ones
+        """
+        ids = {}
+        for obj in self.colors:
+            color, _ = Color.objects.get_or_create(code=obj['fields']['code'],
+                                                   defaults={'name': obj['fields']['name']})
+            ids[obj['pk']] = color.pk
+        return ids
+
+    def edition_codes(self, count):
+        taken = set(Edition.objects.values_list('code', flat=True))
+        codes = []
+        # Synthetic codes start with Z, counting up through the other two characters
+        for first in reversed(CODE_ALPHABET):
+            for second in CODE_ALPHABET:
+                for third in CODE_ALPHABET:
+                    code = first + second + third
+                    if code not in taken:
+                        codes.append(code)
+                        if len(codes) == count:
+                            return codes
+        raise ValueError(f'No room for {count} more edition codes')
+
+    def editions(self, count):
+        first_pk = (Edition.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+        return [
+            {'model': 'cards.edition', 'pk': first_pk + i, 'fields': {'name': f'Synthetic Edition {code}', 'code': code}}
+            for i, code in enumerate(self.edition_codes(count))
+        ]
+
+    def cards(self, count, editions, color_ids):
+        for _ in range(count):
+            fields = dict(self.random.choice(self.templates))
+            edition = self.random.choice(editions)
+            fields['name'] = f'{self.random.choice(self.first_words)} {self.random.choice(self.last_words)}'
+            fields['edition'] = edition['pk']
+            fields['set_name'] = edition['fields']['name']
+            fields['colors'] = [color_ids[pk] for pk in fields['colors']]
+            yield {'model': 'cards.card', 'pk': uuid.UUID(int=self.random.getrandbits(128), version=4),
+                   'fields': fields}
+
+    def objects(self, cards, editions=None):
+        """
+        Fixture objects for `cards` new cards over `editions` new editions. Colors are
+        created straight away, so create the CardLoader after calling this.
+        """
+        color_ids = self.color_ids()
+        editions = self.editions(editions or cards // CARDS_PER_EDITION + 1)
+        return chain(editions, self.cards(cards, editions, color_ids))
@@ -0,0 +1,14 @@
+from django import template
+from django.conf import settings
+
+from cards.images import ImageStore
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_image_url(card, width=None):
+    """
+    The stored thumbnail for card.image_url if `manage.py fetch_images` has fetched it, else the URL itself
+    """
+    return ImageStore().image_url(card.image_url, width or settings.CARDS_IMAGE_WIDTHS[0])
@@ -1,9 +1,15 @@
-from django.urls import path
-
-from cards import views
-
-app_name = 'cards'
-
-urlpatterns = [
-    path('', views.form_create, name='create-card'),
+from django.urls import path
+
+from cards import views
+
+app_name = 'cards'
+
+urlpatterns = [
+    path('', views.form_create, name='create-card'),
+    path('search/', views.card_search, name='search'),
+    path('browse/', views.browse, name='browse'),
+    path('<uuid:pk>/similar/', views.similar_cards, name='similar'),
+    path('editions/autocomplete/', views.edition_autocomplete, name='edition-autocomplete'),
+    path('images/<str:name>', views.card_image, name='image'),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
 ]
\ No newline at end of file
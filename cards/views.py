@@ -1,27 +1,157 @@
-import json
-
-from django.http import HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
 
 # Create your views here.
+from cards import cache, catalogue, facets, featured, sampler, search, similar
 from cards.forms import CardForm
-from cards.models import Card
+from cards.images import CONTENT_TYPES, ImageStore
+from cards.models import Card, Color, Edition
+
+AUTOCOMPLETE_LIMIT = 20
+BROWSE_LIMIT = 60
+# Values listed per browse facet, most cards first; the selected one is always shown
+FACET_VALUE_LIMIT = 30
+FACET_TITLES = {'edition': 'Edition', 'rarity': 'Rarity', 'type': 'Type', 'color': 'Color'}
+COLOR_NAMES = {**dict(Color.COLOR_CHOICES), facets.COLORLESS: 'Colorless'}
+IMAGE_MAX_AGE = 60 * 60 * 24 * 365
+SIMILAR_LIMIT = 12
 
 
-def form_create(request):
+async def form_create(request):
 
     if request.method == 'POST':
-        form = CardForm(request.POST)
-        if form.is_valid():
-            form.save()
+        form = await CardForm.abuild(request.POST)
+        # Field validation looks up the chosen edition and colors
+        if await sync_to_async(form.is_valid)():
+            await form.acreate()
             return HttpResponseRedirect('https://www.google.com')
 
     else:
-        form = CardForm()
+        form = await CardForm.abuild()
 
     return render(request, 'cards/card_create.html', {'name': 'John', 'form': form})
 
-def index(request):
-    cards = Card.objects.order_by('?')[:9]
+async def index(request):
+    if settings.CARDS_FEATURED_SETS:
+        featured.ensure_refresher()
+        chosen = await featured.apick()
+        if chosen:
+            return render(request, 'cards/index.html', {'featured': chosen['html']})
+
+    in_memory = await catalogue.acurrent()
+    if in_memory is not None:
+        cards = in_memory.sample(sampler.SAMPLE_SIZE)
+        tiles = await cache.arender_tiles(cards, in_memory)
+        return render(request, 'cards/index.html', {'cards': cards, 'tiles': tiles})
+
+    # Only what the tile cache keys need; cache.arender_tiles loads the rest on a miss
+    cards = await sampler.asample_cards(9, Card.objects.only('id', 'edition_id', 'sample_slot'))
+    tiles = await cache.arender_tiles(cards)
+
+    return render(request, 'cards/index.html', {'cards': cards, 'tiles': tiles})
+
+async def card_search(request):
+    query = request.GET.get('q', '')
+    in_memory = await catalogue.acurrent()
+    if in_memory is not None:
+        cards = in_memory.search(query, search.RESULT_LIMIT)
+    else:
+        cards = await search.asearch_cards(query, Card.objects.for_listing())
+
+    return render(request, 'cards/search.html', {'query': query, 'cards': cards})
+
+def shown_values(facet, counts, selected):
+    shown = sorted(counts, key=lambda value: (-counts[value], value))[:FACET_VALUE_LIMIT]
+    if facet in selected and selected[facet] not in shown:
+        shown.append(selected[facet])
+    return shown
+
+
+def facet_options(request, facet, counts, selected, labels, params):
+    options = []
+    for value in shown_values(facet, counts, selected):
+        query = request.GET.copy()
+        query[facet] = params.get(value, value)
+        options.append({'label': labels.get(value, value), 'count': counts.get(value, 0),
+                        'selected': selected.get(facet) == value, 'query': query.urlencode()})
+    return options
+
+
+async def browse(request):
+    selected = {facet: request.GET[facet] for facet in facets.BROWSE_FACETS if request.GET.get(facet)}
+    if 'edition' in selected:
+        # Editions are chosen by code but counted by pk
+        edition = await Edition.objects.filter(code=selected['edition']).afirst()
+        if edition is None:
+            raise Http404('No such edition')
+        selected['edition'] = str(edition.pk)
+    if selected.get('color', facets.COLORLESS) not in (*Color.BITS, facets.COLORLESS):
+        # One color code at a time
+        raise Http404('No such color')
+
+    total, counts = await facets.abrowse_counts(selected)
+    cards = facets.filter_cards(Card.objects.for_listing(), selected).order_by('name', 'id')[:BROWSE_LIMIT]
+    cards = [card async for card in cards]
+
+    # Names and codes for the editions that will be listed
+    editions = await Edition.objects.ain_bulk([int(pk) for pk in shown_values('edition', counts['edition'], selected)])
+    labels = {'edition': {str(pk): str(edition) for pk, edition in editions.items()}, 'color': COLOR_NAMES}
+    params = {'edition': {str(pk): edition.code for pk, edition in editions.items()}}
+    groups = []
+    for facet in facets.BROWSE_FACETS:
+        clear = request.GET.copy()
+        clear.pop(facet, None)
+        groups.append({
+            'title': FACET_TITLES[facet],
+            'options': facet_options(request, facet, counts[facet], selected, labels.get(facet, {}),
+                                     params.get(facet, {})),
+            'selected': facet in selected,
+            'clear_query': clear.urlencode(),
+        })
+
+    return render(request, 'cards/browse.html', {'total': total, 'cards': cards, 'facets': groups})
+
+async def similar_cards(request, pk):
+    card = await Card.objects.select_related('edition').filter(pk=pk).afirst()
+    if card is None:
+        raise Http404('No such card')
+
+    index = similar.open_index()
+    cards = []
+    if index is not None:
+        ids = index.similar_to(card, SIMILAR_LIMIT)
+        # The index may still list cards deleted since it was built
+        found = await Card.objects.for_listing().ain_bulk(ids)
+        cards = [found[pk] for pk in ids if pk in found]
+
+    return render(request, 'cards/similar.html', {'card': card, 'cards': cards, 'indexed': index is not None})
+
+async def edition_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    editions = Edition.objects.filter(Q(name__icontains=query) | Q(code__iexact=query))[:AUTOCOMPLETE_LIMIT]
+    return JsonResponse({'results': [{'id': edition.code, 'text': str(edition)} async for edition in editions]})
+
+def image_etag(request, name):
+    # Names are content hashes, so the name is as strong a validator as any
+    return name
+
+
+@cache_control(public=True, max_age=IMAGE_MAX_AGE, immutable=True)
+@etag(image_etag)
+def card_image(request, name):
+    path = ImageStore().resolve(name)
+    if path is None:
+        raise Http404('No such image')
+    return FileResponse(path.open('rb'), content_type=CONTENT_TYPES[path.suffix[1:]])
 
-    return render(request, 'cards/index.html', {'cards': cards})
\ No newline at end of file
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse(cache.stats())
@@ -0,0 +1,58 @@
+from django import forms
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+
+class CachedOptionsSelect(forms.Select):
+    """
+    A select that writes out pre-rendered <option> markup (see cards.choices)
+    instead of rendering a template for every option
+    """
+    def __init__(self, attrs=None, options='', empty_label=None, multiple=False):
+        super().__init__(attrs)
+        self.options = options
+        self.empty_label = empty_label
+        self.allow_multiple_selected = multiple
+
+    def render(self, name, value, attrs=None, renderer=None):
+        options = self.options
+        if self.empty_label is not None:
+            options = format_html('<option value="">{}</option>', self.empty_label) + options
+        for selected in self.format_value(value):
+            tag = format_html('<option value="{}">', selected)
+            options = options.replace(tag, tag[:-1] + ' selected>', 1)
+        attrs = self.build_attrs(self.attrs, attrs)
+        if self.allow_multiple_selected:
+            attrs['multiple'] = True
+        return format_html('<select name="{}"{}>{}</select>', name, flatatt(attrs), mark_safe(options))
+
+    def value_from_datadict(self, data, files, name):
+        if self.allow_multiple_selected:
+            return forms.SelectMultiple.value_from_datadict(self, data, files, name)
+        return super().value_from_datadict(data, files, name)
+
+    def value_omitted_from_data(self, data, files, name):
+        # An unselected multiple select sends nothing, like SelectMultiple
+        return not self.allow_multiple_selected and super().value_omitted_from_data(data, files, name)
+
+    def use_required_attribute(self, initial):
+        # Browsers only accept required on a single select whose first option is empty
+        return not self.is_hidden and (self.allow_multiple_selected or self.empty_label is not None)
+
+
+class EditionAutocomplete(forms.TextInput):
+    """
+    Free-text edition code with suggestions fetched from url as the user types
+    """
+    class Media:
+        js = ['js/edition_autocomplete.js']
+
+    def __init__(self, url, attrs=None):
+        super().__init__({'autocomplete': 'off', **(attrs or {})})
+        self.url = url
+
+    def render(self, name, value, attrs=None, renderer=None):
+        list_id = f'{name}-suggestions'
+        attrs = {**(attrs or {}), 'list': list_id, 'data-autocomplete-url': self.url}
+        return format_html('{}<datalist id="{}"></datalist>', super().render(name, value, attrs, renderer), list_id)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware too
+    'cards.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +58,8 @@ ROOT_URLCONF = 'mtgcards.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timed for cards.instrumentation
+        'BACKEND': 'cards.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / "global_templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +87,81 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory per process by default. Point MTGCARDS_CACHE_DIR at a directory
+# to share a file-based cache between processes instead; without it, changes made
+# by management commands do not invalidate the running server's cached tiles.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mtgcards',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+if os.environ.get('MTGCARDS_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['MTGCARDS_CACHE_DIR'],
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+# Render CardForm's edition as a code input with suggestions from
+# cards:edition-autocomplete instead of a select listing every edition
+CARDS_EDITION_AUTOCOMPLETE = False
+
+# Pre-rendered homepage sets, see cards.featured. 0 sets turns the pool off.
+# A per-process cache needs the in-process refresher thread. With a shared
+# cache, keep one `manage.py refresh_featured` process running instead: the
+# pool expires a few intervals after the last refresh, and the homepage then
+# falls back to live sampling.
+
+CARDS_FEATURED_SETS = int(os.environ.get('MTGCARDS_FEATURED_SETS', '0'))
+CARDS_FEATURED_INTERVAL = int(os.environ.get('MTGCARDS_FEATURED_INTERVAL', '60'))
+CARDS_FEATURED_THREAD = not os.environ.get('MTGCARDS_CACHE_DIR')
+
+# Serve the index, search and the JSON API from an in-memory copy of the
+# catalogue (see cards.catalogue), rebuilt in the background after changes
+CARDS_MEMORY_CATALOGUE = os.environ.get('MTGCARDS_MEMORY_CATALOGUE', '') == '1'
+
+# Card image store, see cards.images; tiles use the first width
+CARDS_IMAGE_ROOT = Path(os.environ.get('MTGCARDS_IMAGE_ROOT', BASE_DIR / 'media' / 'card-images'))
+CARDS_IMAGE_WIDTHS = (250,)
+
+# "Cards like this one" index, see cards.similar
+CARDS_SIMILAR_ROOT = Path(os.environ.get('MTGCARDS_SIMILAR_ROOT', BASE_DIR / 'media' / 'similar'))
+
+
+# Request instrumentation, see cards.instrumentation
+# Share of requests logged to 'cards.perf'; MTGCARDS_PERF_LOG names the file
+# those lines go to, which `manage.py perfstats` reads by default.
+
+CARDS_PERF_SAMPLE_RATE = float(os.environ.get('MTGCARDS_PERF_SAMPLE_RATE', '0.1'))
+CARDS_PERF_LOG = os.environ.get('MTGCARDS_PERF_LOG')
+# The Server-Timing header tells clients how long the server spent, so only in development by default
+CARDS_SERVER_TIMING = os.environ.get('MTGCARDS_SERVER_TIMING', '1' if DEBUG else '0') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {},
+    'loggers': {},
+}
+
+if CARDS_PERF_LOG:
+    LOGGING['handlers']['perf'] = {
+        'class': 'logging.handlers.WatchedFileHandler',
+        'filename': CARDS_PERF_LOG,
+        'formatter': 'message',
+    }
+    LOGGING['loggers']['cards.perf'] = {'handlers': ['perf'], 'level': 'INFO', 'propagate': False}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,46 @@
+"""
+SQLite tuning profile: WAL, connection pragmas and an optional read-only replica.
+
+    DJANGO_SETTINGS_MODULE=mtgcards.settings_production
+
+WAL needs a local filesystem with working shared memory, so don't use this on
+network mounts. Set MTGCARDS_READ_REPLICA=1 to route Card/Edition reads through
+a second, read-only connection to the same file.
+"""
+import os
+from .settings import *
+
+DATABASES['default'].update({
+    'OPTIONS': {
+        # Seconds sqlite3 waits on a locked database before raising
+        'timeout': 10,
+        # Take the write lock when a transaction starts instead of failing to upgrade mid-way
+        'transaction_mode': 'IMMEDIATE',
+    },
+    # Applied to every new connection by cards.signals.apply_sqlite_pragmas
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative sizes are KiB, so 64 MB of page cache per connection
+        'cache_size': -64 * 1024,
+        'busy_timeout': 10000,
+        'temp_store': 'MEMORY',
+    },
+})
+
+if os.environ.get('MTGCARDS_READ_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Django opens SQLite with uri=True, so mode=ro makes the connection read-only
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'OPTIONS': {'timeout': 10},
+        'PRAGMAS': {
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'busy_timeout': 10000,
+            'query_only': 1,
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['cards.routers.ReadReplicaRouter']
@@ -20,5 +20,6 @@ from cards import views as card_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('cards/', include('cards.urls')),
+    path('api/cards/', include('cards.api_urls')),
     path('', card_views.index, name='index')
 ]
@@ -0,0 +1,20 @@
+// Fills an edition input's <datalist> from the autocomplete endpoint as the user types
+document.querySelectorAll('input[data-autocomplete-url]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer;
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value))
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    list.replaceChildren.apply(list, data.results.map(function (result) {
+                        var option = document.createElement('option');
+                        option.value = result.id;
+                        option.textContent = result.text;
+                        return option;
+                    }));
+                });
+        }, 150);
+    });
+});